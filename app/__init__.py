@@ -1,18 +1,181 @@
-from flask import Flask
+import os
+import time
+import weakref
+from flask import Flask, current_app, g, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from config import Config
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import import_string
+from sqlalchemy import event
+from config import get_config
+from .cache import TTLCache, ResponseCache
+from .metrics import Metrics
+from .routing import RoutingSession, pin_writers
+from .passwords import PasswordHasher
+from .profiling import ProfileStore, SlowQueryLog, start_profile, finish_profile, abandon_profile
 
-# app = Flask instance with the name of the current module (will be our central object)
-app = Flask(__name__) # check by running flask shell, 'app'
+# Create a SQL Alchemy instance called db which will be central obj - it's bound to an app in create_app
+# RoutingSession sends GET requests' reads to the 'read' bind when there is one
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-#Set config for the app with from_obj
-app.config.from_object(Config)
+# Create an instance of Migrate
+migrate = Migrate()
 
-# Create a SQL Alchemy instance called db which will be central obj (passing in 'app', the instance of our flask app)
-db = SQLAlchemy(app) # check by running flask shell, 'db'
+# Every app built in this process that's still alive, for the fork hook below
+apps = weakref.WeakSet()
+
+
+# A forked worker must not reuse connections it inherited from the parent - drop them (without closing the parent's
+# sockets) so each worker opens its own on first use. Registered once here rather than in create_app, since fork hooks
+# can't be unregistered and would pile up with every app the tests or CLI build
+def dispose_engines_after_fork():
+    for app in list(apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_engines_after_fork)
+
+
+# Application factory - builds a configured app. Nothing is created at import time, so importing the package is cheap,
+# tests/CLI can build as many differently configured apps as they need, and a pre-fork server (gunicorn --preload wsgi:app)
+# can build the app once in the master and share it with its workers
+def create_app(config_class=None):
+    # app = Flask instance with the name of the current module (will be our central object)
+    app = Flask(__name__)
+
+    #Set config for the app with from_obj (the APP_PROFILE performance profile unless a config is passed in)
+    app.config.from_object(config_class or get_config())
+
+    # Take the client address from X-Forwarded-For when behind PROXY_FIX_X_FOR trusted proxies
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
+    # Engines are created here but don't open a connection until the first query
+    db.init_app(app)
+    migrate.init_app(app, db)
+
+    # Run the profile's PRAGMAs on every new SQLite connection
+    pragmas = app.config['SQLITE_PRAGMAS']
+    if pragmas:
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', lambda dbapi_connection, connection_record: set_sqlite_pragmas(dbapi_connection, pragmas))
+
+    # Bounded password hashing pool (see passwords.py)
+    app.extensions['password_hasher'] = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE'])
+
+    # Rate limit buckets (see ratelimit.py)
+    app.extensions['rate_limiter'] = import_string(app.config['RATE_LIMIT_BACKEND'])()
+
+    # Cache of verified tokens (see auth.py) - in this process unless TOKEN_CACHE_BACKEND is shared
+    app.extensions['token_cache'] = import_string(app.config['TOKEN_CACHE_BACKEND'])(maxsize=app.config['TOKEN_CACHE_SIZE'], ttl=app.config['TOKEN_CACHE_TTL'])
+
+    # Read-through cache of task responses (see cache.py), invalidated by the session events in models.py - off
+    # unless RESPONSE_CACHE_BACKEND is set
+    app.extensions['response_cache'] = None
+    if app.config['RESPONSE_CACHE_BACKEND']:
+        backend = import_string(app.config['RESPONSE_CACHE_BACKEND'])(maxsize=app.config['RESPONSE_CACHE_SIZE'], ttl=app.config['RESPONSE_CACHE_TTL'])
+        app.extensions['response_cache'] = ResponseCache(backend)
+
+    # On-demand request profiling and the slow query log (see profiling.py) - the profile hooks are registered first
+    # so a profile covers the other hooks too, including the final commit
+    app.extensions['profiles'] = ProfileStore(app.config['PROFILE_KEEP'])
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(abandon_profile)
+    if app.config['SLOW_QUERY_MS']:
+        app.extensions['slow_queries'] = SlowQueryLog(app.config['SLOW_QUERY_MS'], app.config['SLOW_QUERY_KEEP'])
+
+    # Request metrics (see metrics.py) - registered before the unit-of-work hooks so the final commit is part of the measured time
+    app.extensions['metrics'] = Metrics()
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.teardown_request(record_request_exception)
+
+    # Read-your-writes - clients that just wrote are pinned to the primary (runs after the commit below)
+    app.extensions['read_your_writes'] = TTLCache(100000, app.config['READ_YOUR_WRITES_SECONDS'])
+    app.after_request(pin_session_writers)
+
+    # Unit of work - commit everything a request staged in one transaction, or throw it away if the request failed
+    app.after_request(commit_session)
+    app.teardown_request(rollback_session)
+
+    from .routes import bp
+    app.register_blueprint(bp)
+
+    from .commands import seed, sync_replica, reconcile_stats, purge_tokens, purge_users, profile_token
+    app.cli.add_command(seed)
+    app.cli.add_command(sync_replica)
+    app.cli.add_command(reconcile_stats)
+    app.cli.add_command(purge_tokens)
+    app.cli.add_command(purge_users)
+    app.cli.add_command(profile_token)
+
+    # A forked worker must not reuse connections it inherited from the parent (see dispose_engines_after_fork)
+    apps.add(app)
+
+    return app
+
+
+def set_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+# REQUEST HOOKS - registered on each app in create_app
+
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.auth_time = 0.0
+
+
+def record_request_metrics(response):
+    if 'request_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'unmatched'
+    metrics = current_app.extensions['metrics']
+    metrics.count_request(endpoint, response.status_code)
+    metrics.observe('http_request_duration_seconds', endpoint, elapsed)
+    metrics.observe('http_request_sql_queries', endpoint, g.sql_count)
+    metrics.observe('http_request_sql_duration_seconds', endpoint, g.sql_time)
+    metrics.observe('http_request_auth_duration_seconds', endpoint, g.auth_time)
+    size = response.calculate_content_length()
+    if size is not None:
+        metrics.observe('http_response_size_bytes', endpoint, size)
+    if current_app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = (f'app;dur={elapsed * 1000:.2f}, db;dur={g.sql_time * 1000:.2f};desc="{g.sql_count} queries", '
+                                             f'auth;dur={g.auth_time * 1000:.2f}')
+    return response
+
+
+def record_request_exception(exc):
+    if exc is not None:
+        current_app.extensions['metrics'].count_exception(request.endpoint or 'unmatched')
+
+
+def pin_session_writers(response):
+    return pin_writers(response, db.session())
+
+
+def commit_session(response):
+    if response.status_code < 400:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return response
+
+
+def rollback_session(exc):
+    if exc is not None:
+        db.session.rollback()
 
-# Create an instance of Migrate
-migrate = Migrate(app, db)
 
-from . import routes, models
\ No newline at end of file
+from . import models, purge
@@ -1,15 +1,25 @@
+from flask import current_app
 from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth
 from . import db
 from .models import User
+from .cache import token_cache
+from .metrics import timed_auth
+from .ratelimit import limit_auth_failures
+from .passwords import password_hasher
 from datetime import datetime, timezone 
 
 basic_auth = HTTPBasicAuth()
 token_auth = HTTPTokenAuth()
 
 @basic_auth.verify_password
+@timed_auth
+@limit_auth_failures
 def verify(username, password):
     user = db.session.execute(db.select(User).where(User.username==username)).scalar_one_or_none()
-    if user is not None and user.check_password(password):
+    if user is None:
+        password_hasher().verify_unknown_user(password)
+        return None
+    if user.check_password(password):
         return user
     return None
 
@@ -18,12 +28,36 @@ def handle_error(status_code):
     return {'error':"Incorrect username and/or password. Please try again"}, status_code 
 
 @token_auth.verify_token
+@timed_auth
+@limit_auth_failures
 def verify(token):
+    now = datetime.now(timezone.utc)
+    cached = token_cache().get(token)
+    if cached is not None:
+        user_id, token_expiration = cached
+        if token_expiration > now:
+            # The user itself is always loaded fresh - only the token lookup is cached, so the responses (and ETags)
+            # built from it never lag behind a change made through another worker
+            user = db.session.get(User, user_id)
+            if user is not None:
+                return user
+        token_cache().delete(token)
+        return None
     user = db.session.execute(db.select(User).where(User.token==token)).scalar_one_or_none()
-    if user is not None and user.token_expiration > datetime.now(timezone.utc):
-        return user 
+    if user is not None:
+        token_expiration = user.token_expiration.replace(tzinfo=timezone.utc)
+        if token_expiration > now:
+            token_cache().set(token, (user.id, token_expiration), ttl=(token_expiration - now).total_seconds())
+            return user 
     return None 
 
+# Users listed in ADMIN_USERNAMES get the 'admin' role, for routes behind @token_auth.login_required(role='admin')
+@token_auth.get_user_roles
+def get_user_roles(user):
+    return ['admin'] if user.username in current_app.config['ADMIN_USERNAMES'] else []
+
 @token_auth.error_handler
 def handle_error(status_code):
+    if status_code == 403:
+        return {'error':"You do not have permission to do that"}, status_code
     return {'error':"Incorrect token. Please try again"}, status_code 
@@ -0,0 +1,152 @@
+import secrets
+import time
+from collections import OrderedDict
+from threading import Lock
+from flask import current_app
+
+
+# Cache backend interface - the response cache only needs get/set/delete, so anything shared between processes (e.g. a
+# small local key/value server) can stand in for the in-process TTLCache below. Values are plain dicts/lists/tuples
+class CacheBackend:
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    # Optional - {'hits', 'misses', 'size'} for /metrics, or None
+    def stats(self):
+        return None
+
+
+class TTLCache(CacheBackend):
+    # A small thread-safe LRU cache where every entry also expires after a TTL (in seconds)
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+
+# Maps token -> (user id, token expiration) so token auth can load the user by primary key instead of looking the token up
+def token_cache():
+    return current_app.extensions['token_cache']
+
+
+# Read-through cache of serialized task responses. Single tasks are cached by id and dropped as soon as a write to them
+# commits. List pages can't be invalidated one by one (any write can move a task onto or off any page), so their keys
+# include a generation that every committed task write replaces. A task embeds its author, so a cached task is also
+# tied to a per-user generation that changes when the author is updated or deleted. Invalidation happens in the
+# committing process's backend, so every worker has to share one backend for the cache to stay correct
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    # A generation that has expired or been evicted is just replaced, which only orphans the entries made under it
+    def _generation(self, key):
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = secrets.token_hex(8)
+            self.backend.set(key, generation)
+        return generation
+
+    # Returns the cached (body, etag, last modified) for a task or None
+    def get_task(self, task_id):
+        entry = self.backend.get(f'task:{task_id}')
+        hit = entry is not None and entry[0] == self._generation(f'user:{entry[1]}:generation')
+        self._count(hit)
+        return entry[2] if hit else None
+
+    # Take this before reading a task from the database and pass it to set_task - if a write commits in between, the
+    # generation changes and the (possibly older) copy that was read isn't cached
+    def generation(self):
+        return self._generation('tasks:generation')
+
+    # Writes first and checks after - invalidate() replaces the generation before it drops task entries, so an
+    # invalidation that lands between our read and our write either deletes the entry itself or is seen by the check
+    def set_task(self, task_id, author_id, response, generation):
+        key = f'task:{task_id}'
+        author_generation = self._generation(f'user:{author_id}:generation')
+        self.backend.set(key, (author_generation, author_id, response))
+        if self.backend.get('tasks:generation') != generation:
+            self.backend.delete(key)
+
+    # Taken before reading the page, for the same reason
+    def page_key(self, path):
+        return f'tasks:{self.generation()}:{path}'
+
+    def get_page(self, key):
+        response = self.backend.get(key)
+        self._count(response is not None)
+        return response
+
+    def set_page(self, key, response):
+        self.backend.set(key, response)
+
+    # The generation goes first - see set_task
+    def invalidate(self, task_ids=(), user_ids=()):
+        if task_ids or user_ids:
+            self.backend.delete('tasks:generation')
+        for user_id in user_ids:
+            self.backend.delete(f'user:{user_id}:generation')
+        for task_id in task_ids:
+            self.backend.delete(f'task:{task_id}')
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {'hits': hits, 'misses': misses, 'ratio': hits / (hits + misses) if hits + misses else 0.0}
+
+
+# None when the response cache is turned off (RESPONSE_CACHE_BACKEND unset)
+def response_cache():
+    return current_app.extensions['response_cache']
@@ -0,0 +1,125 @@
+import random
+import secrets
+import sqlite3
+import time
+from datetime import date, timedelta
+import click
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from flask.cli import with_appcontext
+from . import db
+from .models import User, Task, UserTaskStats, add_task_delta, update_task_stats
+from .purge import purge_expired_tokens, purge_user, pending_user_ids
+from .profiling import PROFILE_HEADER, make_profile_token
+
+# CLI COMMANDS - added to the app in create_app, run with `flask <command>`
+
+
+# Bulk-insert synthetic users and tasks for load testing, e.g. `flask seed --users 1000 --tasks 1000000`
+# Rows go in through Core executemany inserts, one commit per batch, skipping the per-object work in User/Task.__init__
+# (every seeded user shares one password hash, so seeding doesn't spend minutes hashing)
+@click.command('seed')
+@click.option('--users', default=100, show_default=True, help='Number of users to create')
+@click.option('--tasks', default=10000, show_default=True, help='Number of tasks to create, spread across the new users')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT batch/commit')
+@click.option('--password', default='password', show_default=True, help='Password for every seeded user')
+@with_appcontext
+def seed(users, tasks, batch_size, password):
+    start = time.perf_counter()
+    prefix = f'seed_{secrets.token_hex(4)}'
+    password_hash = generate_password_hash(password, current_app.config['PASSWORD_HASH_METHOD'])
+    for i in range(0, users, batch_size):
+        rows = [{'first_name': 'Seed', 'last_name': f'User {n}', 'username': f'{prefix}_{n}', 'email': f'{prefix}_{n}@example.com', 'password': password_hash}
+                for n in range(i, min(i + batch_size, users))]
+        db.session.execute(User.__table__.insert(), rows)
+        db.session.commit()
+    user_ids = db.session.execute(db.select(User.id).where(User.username.startswith(f'{prefix}_'))).scalars().all()
+    click.echo(f'Created {len(user_ids)} users ({prefix}_0 ... {prefix}_{users - 1}, password {password!r})')
+
+    if user_ids:
+        today = date.today()
+        for i in range(0, tasks, batch_size):
+            rows = [{'title': f'Task {n}', 'description': f'Seeded task {n} for load testing', 'completed': random.random() < 0.3,
+                     'dueDate': today + timedelta(days=random.randint(-60, 60)), 'user_id': user_ids[n % len(user_ids)]}
+                    for n in range(i, min(i + batch_size, tasks))]
+            db.session.execute(Task.__table__.insert(), rows)
+            deltas = {}
+            for row in rows:
+                add_task_delta(deltas, row['user_id'], 1, int(row['completed']))
+            update_task_stats(deltas)
+            db.session.commit()
+            click.echo(f'\r  {min(i + batch_size, tasks)}/{tasks} tasks', nl=False)
+        click.echo(f'\rCreated {tasks} tasks')
+    elapsed = time.perf_counter() - start
+    click.echo(f'Done in {elapsed:.1f}s ({(users + tasks) / elapsed:.0f} rows/s)')
+
+
+# Local stand-in for replication - copy the primary SQLite database over the 'read' bind's file (DATABASE_READ_URL),
+# so read/write routing can be tried out with two SQLite files. Run it again whenever the "replica" should catch up
+@click.command('sync-replica')
+@with_appcontext
+def sync_replica():
+    engines = db.engines
+    if 'read' not in engines:
+        raise click.ClickException('No read replica configured - set DATABASE_READ_URL')
+    if engines[None].dialect.name != 'sqlite' or engines['read'].dialect.name != 'sqlite':
+        raise click.ClickException('sync-replica only copies SQLite databases')
+    engines['read'].dispose()
+    source = sqlite3.connect(engines[None].url.database)
+    target = sqlite3.connect(engines['read'].url.database)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+    click.echo(f"Copied {engines[None].url.database} to {engines['read'].url.database}")
+
+
+# Rebuild the per-user task counters (user_task_stats) from the task table with one GROUP BY, e.g. after writes that
+# bypassed the app or to check for drift. Runs in a single transaction, so readers never see a half-rebuilt table
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats():
+    stats = UserTaskStats.__table__
+    counts = db.select(Task.user_id, db.func.count(), db.func.coalesce(db.func.sum(db.case((Task.completed, 1), else_=0)), 0)).group_by(Task.user_id)
+    actual = {user_id: (total, completed) for user_id, total, completed in db.session.execute(counts)}
+    stored = {row.user_id: (row.total, row.completed) for row in db.session.execute(db.select(stats.c.user_id, stats.c.total, stats.c.completed))}
+    drifted = sum(1 for user_id in set(actual) | set(stored) if actual.get(user_id, (0, 0)) != stored.get(user_id, (0, 0)))
+    db.session.execute(stats.delete())
+    db.session.execute(stats.insert().from_select(['user_id', 'total', 'completed'], counts))
+    db.session.commit()
+    click.echo(f'Recounted tasks for {len(actual)} users ({drifted} had drifted)')
+
+
+# Clear expired tokens in small batches, e.g. from cron, or keep running with `flask purge-tokens --interval 3600`
+@click.command('purge-tokens')
+@click.option('--batch-size', type=int, help='Users per UPDATE/commit (default PURGE_BATCH_SIZE)')
+@click.option('--interval', type=float, default=0, help='Keep running, purging every this many seconds')
+@with_appcontext
+def purge_tokens(batch_size, interval):
+    batch_size = batch_size or current_app.config['PURGE_BATCH_SIZE']
+    while True:
+        click.echo(f'Cleared {purge_expired_tokens(batch_size)} expired tokens')
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+# Finish deleting users whose background delete was interrupted
+@click.command('purge-users')
+@click.option('--batch-size', type=int, help='Rows per DELETE/commit (default PURGE_BATCH_SIZE)')
+@with_appcontext
+def purge_users(batch_size):
+    batch_size = batch_size or current_app.config['PURGE_BATCH_SIZE']
+    user_ids = pending_user_ids()
+    for user_id in user_ids:
+        purge_user(user_id, batch_size)
+    click.echo(f'Purged {len(user_ids)} users')
+
+
+# Print a header that makes the server profile a request, e.g. curl -H "$(flask profile-token)" .../tasks
+@click.command('profile-token')
+@with_appcontext
+def profile_token():
+    if not current_app.config['SECRET_KEY']:
+        raise click.ClickException('Set SECRET_KEY to sign profile tokens')
+    click.echo(f'{PROFILE_HEADER}: {make_profile_token()}')
@@ -0,0 +1,39 @@
+import hashlib
+from datetime import timezone
+from flask import request, make_response
+
+# Conditional GET helpers - ETags are built from row versions, so a client that already has the current
+# version can be answered with a 304 from a cheap version lookup instead of loading and serializing the rows
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+def has_conditions():
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def is_not_modified(etag, last_modified=None):
+    # If-None-Match wins over If-Modified-Since when a client sends both
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None and last_modified is not None:
+        return as_utc(last_modified).replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def tag_response(body, etag, last_modified=None):
+    response = make_response(body)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = as_utc(last_modified)
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    return tag_response(('', 304), etag, last_modified)
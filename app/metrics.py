@@ -0,0 +1,121 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+from threading import Lock
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-endpoint request metrics (latency, SQL query count/time, response size, auth time), rendered in the
+# Prometheus text format at /metrics. The request hooks that feed this live in app/__init__.py
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    # name -> (help text, buckets)
+    histograms = {
+        'http_request_duration_seconds': ('Request latency', LATENCY_BUCKETS),
+        'http_request_sql_queries': ('SQL statements executed per request', QUERY_COUNT_BUCKETS),
+        'http_request_sql_duration_seconds': ('Time spent executing SQL per request', LATENCY_BUCKETS),
+        'http_response_size_bytes': ('Response body size', SIZE_BUCKETS),
+        'http_request_auth_duration_seconds': ('Time spent in basic/token auth per request', LATENCY_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = Lock()
+        self._histograms = defaultdict(dict)  # name -> endpoint -> Histogram
+        self._requests = defaultdict(int)  # (endpoint, status) -> count
+        self._exceptions = defaultdict(int)  # endpoint -> count
+
+    def observe(self, name, endpoint, value):
+        with self._lock:
+            histogram = self._histograms[name].get(endpoint)
+            if histogram is None:
+                histogram = self._histograms[name][endpoint] = Histogram(self.histograms[name][1])
+            histogram.observe(value)
+
+    def count_request(self, endpoint, status):
+        with self._lock:
+            self._requests[(endpoint, status)] += 1
+
+    def count_exception(self, endpoint):
+        with self._lock:
+            self._exceptions[endpoint] += 1
+
+    def render(self, extra=()):
+        # extra - (name, type, help text, value) for values owned by other parts of the app, e.g. cache counters
+        lines = []
+        with self._lock:
+            lines += ['# HELP http_requests_total Requests handled', '# TYPE http_requests_total counter']
+            for (endpoint, status), count in sorted(self._requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            lines += ['# HELP http_request_exceptions_total Requests that raised an unhandled exception', '# TYPE http_request_exceptions_total counter']
+            for endpoint, count in sorted(self._exceptions.items()):
+                lines.append(f'http_request_exceptions_total{{endpoint="{endpoint}"}} {count}')
+            for name, (help_text, buckets) in self.histograms.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for endpoint, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+        for name, metric_type, help_text, value in extra:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+# Count and time every SQL statement against the request that issued it
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_time += elapsed
+    # Slow query log (see profiling.py)
+    slow_queries = current_app.extensions.get('slow_queries') if has_app_context() else None
+    if slow_queries is not None and elapsed >= slow_queries.threshold:
+        slow_queries.record(statement, parameters, elapsed)
+
+
+@event.listens_for(Engine, 'handle_error')
+def drop_query_timer(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+# Wrap an auth verify callback so the time it takes is reported separately from the handler's
+def timed_auth(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            if 'auth_time' in g:
+                g.auth_time += time.perf_counter() - start
+    return decorated
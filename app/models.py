@@ -1,7 +1,25 @@
 import secrets 
+from threading import Condition
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
 from . import db
+from .cache import token_cache, response_cache
+from flask import current_app, has_app_context, has_request_context
 from datetime import datetime, timezone, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import password_hasher
+
+# Commit straight away, or (in 'request' transaction mode) just flush so ids/defaults are set and leave the commit to the end of the request
+def commit(immediate=False):
+    if immediate or not has_request_context() or current_app.config['DB_TRANSACTION_MODE'] == 'immediate':
+        db.session.commit()
+    else:
+        db.session.flush()
+
+
+# Never matches any password (check_password_hash rejects it) - marks users that are waiting to be purged
+UNUSABLE_PASSWORD = '!'
+
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,9 +29,15 @@ class User(db.Model):
     email = db.Column(db.String, nullable=False, unique=True)
     password = db.Column(db.String, nullable=False)
     date_created = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
-    tasks = db.relationship('Task', back_populates='author')
+    # passive_deletes='all' - deleting a user never loads its tasks (they're removed with set-based DELETEs in delete())
+    tasks = db.relationship('Task', back_populates='author', passive_deletes='all')
     token = db.Column(db.String, index=True, unique=True)
-    token_expiration = db.Column(db.DateTime(timezone=True))
+    # Indexed for `flask purge-tokens`, which looks for the expired ones
+    token_expiration = db.Column(db.DateTime(timezone=True), index=True)
+    # Bumped when a column the user's responses show changes (see bump_user_versions) - used for ETags and Last-Modified,
+    # including those of every task the user wrote
+    date_updated = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=False, default=1)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -24,14 +48,19 @@ class User(db.Model):
 
     def save(self):
         db.session.add(self)
-        db.session.commit()
+        commit()
 
     def set_password(self, plaintext_pass):
-        self.password = generate_password_hash(plaintext_pass)
+        self.password = password_hasher().hash(plaintext_pass)
         self.save()
 
     def check_password(self, plaintext_pass):
-        return check_password_hash(self.password, plaintext_pass)
+        if not password_hasher().verify(self.password, plaintext_pass):
+            return False
+        # Upgrade the stored hash in place when the configured hash parameters have changed since it was made
+        if password_hasher().needs_rehash(self.password):
+            self.set_password(plaintext_pass)
+        return True
     
     def to_dict(self):
         return {
@@ -46,15 +75,32 @@ class User(db.Model):
         now = datetime.now(timezone.utc)
         if self.token and self.token_expiration.replace(tzinfo=timezone.utc) > now + timedelta(minutes=1): # if a user has a token and it doesn't expire in the next minute, then they'll get back the same token, else a new one
             return self.token
+        if self.token:
+            token_cache().delete(self.token)
         self.token = secrets.token_hex(16)
         self.token_expiration = now + timedelta(hours=1) #for the next hour, this token will be valid 
         self.save()
         return {"token": self.token, "tokenExpiration": self.token_expiration}
 
-    # To delete
+    # To delete - the user's tasks (and their change log) go with set-based DELETEs instead of being loaded into the
+    # session one object at a time. A user with more than USER_DELETE_BACKGROUND_THRESHOLD tasks is locked out straight
+    # away instead, and everything is deleted in small transactions in the background once this one commits (see purge.py)
     def delete(self):
+        if self.token:
+            token_cache().delete(self.token)
+        stats = db.session.get(UserTaskStats, self.id)
+        threshold = current_app.config['USER_DELETE_BACKGROUND_THRESHOLD']
+        if threshold and stats is not None and stats.total > threshold:
+            self.token = None
+            self.token_expiration = None
+            self.password = UNUSABLE_PASSWORD
+            db.session.info.setdefault('purge_users', set()).add(self.id)
+            commit()
+            return
+        db.session.execute(db.delete(Task).where(Task.user_id == self.id), execution_options={'synchronize_session': False})
+        db.session.execute(db.delete(TaskChange).where(TaskChange.user_id == self.id))
         db.session.delete(self)
-        db.session.commit()
+        commit()
 
 
 class Task(db.Model):
@@ -63,10 +109,25 @@ class Task(db.Model):
     title = db.Column(db.String, nullable=False)
     description = db.Column(db.String, nullable=False)
     completed = db.Column(db.Boolean, nullable=False, default=False)
-    dueDate = db.Column(db.String, nullable=False)
+    dueDate = db.Column(db.Date, nullable=False)
     createdAt = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)) 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # RE-ADD NULLABLE=FALSE 
     author = db.relationship('User', back_populates='tasks')
+    # Bumped on every UPDATE (including Core/bulk ones) - used for ETags and Last-Modified
+    updatedAt = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=False, default=1, onupdate=db.literal_column('version + 1'))
+    # Per-user task lists - open/completed tasks by due date, and everything newest first (with id as the keyset tiebreaker)
+    __table_args__ = (
+        db.Index('ix_task_user_id_completed_dueDate', 'user_id', 'completed', 'dueDate'),
+        db.Index('ix_task_user_id_createdAt_id', 'user_id', 'createdAt', 'id'),
+        # GET /tasks - one index per sort (TASK_SORT_FIELDS), with and without ?completed, so every page is a range scan
+        # that stops after `limit` rows. (completed, dueDate, id) also counts overdue tasks for the admin stats
+        db.Index('ix_task_createdAt_id', 'createdAt', 'id'),
+        db.Index('ix_task_dueDate_id', 'dueDate', 'id'),
+        db.Index('ix_task_completed_id', 'completed', 'id'),
+        db.Index('ix_task_completed_createdAt_id', 'completed', 'createdAt', 'id'),
+        db.Index('ix_task_completed_dueDate_id', 'completed', 'dueDate', 'id'),
+    )
 
 
     def __init__(self, **kwargs):
@@ -78,29 +139,191 @@ class Task(db.Model):
 
     def save(self):
         db.session.add(self)
-        db.session.commit()
+        commit()
 
     # To transfer Task Object into a dictionary
-    def to_dict(self):
-        return {
+    # author=False leaves out the embedded author (just its id) for responses that side-load users once
+    def to_dict(self, author=True):
+        task_dict = {
             "id": self.id,
             "title": self.title,
             "description": self.description,
             "completed": self.completed,
-            "dueDate": self.dueDate,
+            "dueDate": self.dueDate.isoformat(),
             "createdAt": self.createdAt,
-            "author": self.author.to_dict()  # Erroring - 'NoneType' object has no attribute 'to_dict'
         }
+        if author:
+            task_dict["author"] = self.author.to_dict()  # Erroring - 'NoneType' object has no attribute 'to_dict'
+        else:
+            task_dict["authorId"] = self.user_id
+        return task_dict
     
+    # Fields a client is allowed to change through update (and the bulk update endpoint)
+    allowed_fields = {'title', 'description', 'completed', 'dueDate'}
+
     # To allow updating tasks
     def update(self, **kwargs):
-        allowed_fields = {'title', 'description', 'completed', 'dueDate'}
         for key, value in kwargs.items():
-            if key in allowed_fields:
+            if key in self.allowed_fields:
                 setattr(self, key, value)
         self.save()
 
     # To delete
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
\ No newline at end of file
+        commit()
+
+
+# Append-only log of task writes, so clients can sync what changed since their last cursor (seq) instead of
+# re-downloading every task. Deletes leave a row here too, which is the only trace of them once the task is gone.
+# seq values become visible in seq order: a reader never sees a seq while a smaller one is still uncommitted, so a
+# cursor can't skip past a change that commits late. Readers only ever see one user's changes, so that only has to hold
+# per user: SQLite gets it from its single writer; on Postgres, where a sequence hands out numbers before commit,
+# record_task_changes takes a per-user advisory lock until the transaction ends
+class TaskChange(db.Model):
+    __tablename__ = 'task_change'
+    seq = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String, nullable=False)  # 'create', 'update' or 'delete'
+    changedAt = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    __table_args__ = (db.Index('ix_task_change_user_id_seq', 'user_id', 'seq'),)
+
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "op": self.op,
+            "taskId": self.task_id,
+            "changedAt": self.changedAt
+        }
+
+
+# Lets long-polling /tasks/changes requests in this process wake up as soon as a change is committed
+changes_committed = Condition()
+
+# First half of the Postgres advisory lock keys (TASK_CHANGE_LOCK, user_id) serializing each user's task_change
+# writers - any 32-bit constant that no other advisory lock user picks
+TASK_CHANGE_LOCK = 0x7461736b
+
+
+# Write change rows for [(task_id, user_id), ...] in the current transaction - used directly by the Core bulk writes,
+# everything that goes through the ORM is picked up by the after_flush listener below. The task ids are also kept
+# until commit so their cached responses can be dropped
+def record_task_changes(op, tasks, session=None):
+    session = session or db.session
+    rows = [{'task_id': task_id, 'user_id': user_id, 'op': op} for task_id, user_id in tasks]
+    if rows:
+        connection = session.connection()
+        if connection.dialect.name == 'postgresql':
+            # Once per user and transaction - the locks are released by the commit or rollback, which is also when
+            # task_change_locks is cleared. Taken in user id order so two batches can't each wait on the other
+            locked = session.info.setdefault('task_change_locks', set())
+            for user_id in sorted({row['user_id'] for row in rows} - locked):
+                connection.execute(db.select(db.func.pg_advisory_xact_lock(TASK_CHANGE_LOCK, user_id)))
+                locked.add(user_id)
+        connection.execute(TaskChange.__table__.insert(), rows)
+        session.info['task_changes'] = True
+        session.info.setdefault('changed_tasks', set()).update(row['task_id'] for row in rows)
+
+
+# User columns that end up in task responses (as the embedded author)
+USER_RESPONSE_FIELDS = ('first_name', 'last_name', 'username', 'date_created')
+
+
+# Token rotation, password rehashes and `flask purge-tokens` don't change anything a client sees, so they leave the
+# version alone - otherwise each of them would make every cached copy of the user's tasks look stale
+@event.listens_for(Session, 'before_flush')
+def bump_user_versions(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, User) and any(inspect(obj).attrs[field].history.has_changes() for field in USER_RESPONSE_FIELDS):
+            obj.version = User.version + 1
+            obj.date_updated = datetime.now(timezone.utc)
+
+
+@event.listens_for(Session, 'after_flush')
+def log_task_changes(session, flush_context):
+    for op, objects in (('create', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        tasks = [(obj.id, obj.user_id) for obj in objects if isinstance(obj, Task) and (op != 'update' or session.is_modified(obj))]
+        record_task_changes(op, tasks, session)
+    users = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    users += [obj.id for obj in session.dirty if isinstance(obj, User)
+              and any(inspect(obj).attrs[field].history.has_changes() for field in USER_RESPONSE_FIELDS)]
+    if users:
+        session.info.setdefault('changed_users', set()).update(users)
+
+
+@event.listens_for(Session, 'after_commit')
+def notify_task_changes(session):
+    changed_tasks = session.info.pop('changed_tasks', ())
+    changed_users = session.info.pop('changed_users', ())
+    if (changed_tasks or changed_users) and has_app_context() and response_cache() is not None:
+        response_cache().invalidate(changed_tasks, changed_users)
+    session.info.pop('task_change_locks', None)
+    if session.info.pop('task_changes', False):
+        with changes_committed:
+            changes_committed.notify_all()
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_task_changes(session):
+    session.info.pop('task_changes', None)
+    session.info.pop('task_change_locks', None)
+    session.info.pop('changed_tasks', None)
+    session.info.pop('changed_users', None)
+    session.info.pop('purge_users', None)
+
+
+# Running task counts per user, kept up to date in the same transaction as every task write so stats reads are a
+# primary key lookup. Open = total - completed. Overdue depends on the date, so it's counted from the
+# (user_id, completed, dueDate) index instead. `flask reconcile-stats` rebuilds the table from task if it ever drifts
+class UserTaskStats(db.Model):
+    __tablename__ = 'user_task_stats'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Add {user_id: (total change, completed change)} to the counters in the current transaction, creating missing rows -
+# used directly by the Core bulk writes, the ORM ones go through the after_flush listener below
+def update_task_stats(deltas, session=None):
+    session = session or db.session
+    rows = [{'user_id': user_id, 'total': total, 'completed': completed} for user_id, (total, completed) in deltas.items() if total or completed]
+    if not rows:
+        return
+    connection = session.connection()
+    insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    stmt = insert(UserTaskStats.__table__)
+    stmt = stmt.on_conflict_do_update(index_elements=['user_id'], set_={
+        'total': UserTaskStats.__table__.c.total + stmt.excluded.total,
+        'completed': UserTaskStats.__table__.c.completed + stmt.excluded.completed,
+    })
+    connection.execute(stmt, rows)
+
+
+def add_task_delta(deltas, user_id, total, completed):
+    old_total, old_completed = deltas.get(user_id, (0, 0))
+    deltas[user_id] = (old_total + total, old_completed + completed)
+
+
+# The completed value a task had before this flush
+def completed_before_flush(task):
+    history = inspect(task).attrs.completed.history
+    return bool(history.deleted[0]) if history.deleted else bool(task.completed)
+
+
+@event.listens_for(Session, 'after_flush')
+def count_task_changes(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Task):
+            add_task_delta(deltas, obj.user_id, 1, int(bool(obj.completed)))
+    for obj in session.dirty:
+        if isinstance(obj, Task) and inspect(obj).attrs.completed.history.has_changes():
+            add_task_delta(deltas, obj.user_id, 0, int(bool(obj.completed)) - int(completed_before_flush(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            add_task_delta(deltas, obj.user_id, -1, -int(completed_before_flush(obj)))
+    update_task_stats(deltas, session)
+    deleted_users = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    if deleted_users:
+        session.connection().execute(UserTaskStats.__table__.delete().where(UserTaskStats.user_id.in_(deleted_users)))
@@ -0,0 +1,122 @@
+import base64
+import json
+from datetime import date, datetime
+from . import db
+
+# Keyset (cursor) pagination helpers. A cursor holds the sort value and id of the last row on a page,
+# so the next page is an indexed range scan starting right after it instead of an OFFSET that re-reads every skipped row
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+
+
+def encode_cursor(*values):
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    # Turn a cursor back into python values typed like the columns it was built from
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+    typed = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if isinstance(value, str) and python_type in (date, datetime):
+            try:
+                value = python_type.fromisoformat(value)
+            except ValueError:
+                raise ValueError('Invalid cursor')
+        # Cursors come from clients, so a null or a value of the wrong type (JSON true/false pass as ints) is a 400
+        # rather than something to hand to the database
+        if not isinstance(value, python_type) or (isinstance(value, bool) and python_type is not bool):
+            raise ValueError('Invalid cursor')
+        typed.append(value)
+    return typed
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, maximum)
+
+
+def parse_int(value, name):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+
+def parse_bool(value, name):
+    if value is None:
+        return None
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f'{name} must be true or false')
+
+
+# Dates are always YYYY-MM-DD, in query strings and request bodies alike
+def parse_date(value, name):
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def parse_sort(value, allowed, default):
+    # A leading '-' means descending, e.g. ?sort=-createdAt
+    value = value or default
+    descending = value.startswith('-')
+    name = value.lstrip('-')
+    if name not in allowed:
+        raise ValueError(f"sort must be one of: {', '.join(sorted(allowed))}")
+    return name, allowed[name], descending
+
+
+def paginate(select_stmt, sort_column, id_column, descending, limit, cursor=None):
+    # Apply keyset ordering/filtering and fetch one extra row to know if there's a next page
+    if cursor:
+        if sort_column is id_column:
+            (last_id,) = decode_cursor(cursor, [id_column])
+            select_stmt = select_stmt.where(id_column < last_id if descending else id_column > last_id)
+        else:
+            last_value, last_id = decode_cursor(cursor, [sort_column, id_column])
+            if descending:
+                select_stmt = select_stmt.where(db.or_(sort_column < last_value, db.and_(sort_column == last_value, id_column < last_id)))
+            else:
+                select_stmt = select_stmt.where(db.or_(sort_column > last_value, db.and_(sort_column == last_value, id_column > last_id)))
+    if sort_column is id_column:
+        order_by = [id_column.desc() if descending else id_column.asc()]
+    else:
+        order_by = [sort_column.desc(), id_column.desc()] if descending else [sort_column.asc(), id_column.asc()]
+    return select_stmt.order_by(*order_by).limit(limit + 1)
+
+
+def next_cursor(rows, limit, sort_attr):
+    # rows is the result of a paginate() query; returns (page, cursor or None)
+    page = rows[:limit]
+    if len(rows) <= limit:
+        return page, None
+    last = page[-1]
+    if sort_attr == 'id':
+        return page, encode_cursor(last.id)
+    return page, encode_cursor(getattr(last, sort_attr), last.id)
@@ -0,0 +1,63 @@
+import secrets
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from threading import BoundedSemaphore
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing off the request threads - hashes are computed on a small bounded pool (hashlib's scrypt/pbkdf2
+# release the GIL, so they run in parallel with request handling) and a burst of logins beyond the pool plus its queue
+# is turned away with a 503 instead of piling up and starving every other endpoint of CPU
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method, workers=2, queue_size=32, timeout=10):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._slots = BoundedSemaphore(workers + queue_size)
+        # Hashed here, on the calling thread, so the pool's threads only start once a worker handles requests (gunicorn
+        # preloads the app before forking). Made with the configured method, so checking it costs what a real check does
+        self._dummy_hash = generate_password_hash(secrets.token_hex(16), method)
+
+    # A slot is held from submit until the job finishes, not just while we wait for it - a job we gave up waiting on
+    # still occupies the pool
+    def _run(self, f, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor.submit(f, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy() from None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    # Do the same work as for a wrong password, so an unknown username can't be told apart from one by timing
+    def verify_unknown_user(self, password):
+        self.verify(self._dummy_hash, password)
+        return False
+
+    # The method as werkzeug spells it out in a hash, e.g. 'scrypt' -> 'scrypt:32768:8:1'
+    def canonical_method(self):
+        return self._dummy_hash.split('$', 1)[0]
+
+    # True when a hash was made with different parameters than the ones configured now
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.canonical_method()
+
+
+def password_hasher():
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,199 @@
+import cProfile
+import itertools
+import marshal
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread, get_ident
+from flask import current_app, g, has_request_context, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+# Production profiling. A request is profiled when it carries a valid signed X-Profile header or is picked by
+# PROFILE_SAMPLE_RATE - it then runs under cProfile while a sampler thread records its call stacks, and both are kept
+# in a small ring buffer listed at GET /profiles (admins only). Separately, every SQL statement slower than
+# SLOW_QUERY_MS is logged with where in the app it came from and kept for GET /slow-queries
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SALT = 'profile-request'
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def profile_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=PROFILE_SALT)
+
+
+# The X-Profile header value - a signed, expiring token so clients can't turn profiling on by themselves
+def make_profile_token():
+    return profile_serializer().dumps('profile')
+
+
+def wants_profile():
+    token = request.headers.get(PROFILE_HEADER)
+    if token and current_app.config['SECRET_KEY']:
+        try:
+            profile_serializer().loads(token, max_age=current_app.config['PROFILE_TOKEN_MAX_AGE'])
+            return True
+        except BadSignature:
+            pass
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+# Samples one thread's Python stack every interval seconds - cProfile only knows caller/callee pairs, so whole stacks
+# for a flame graph have to come from sampling
+class StackSampler(Thread):
+    def __init__(self, thread_id, interval=0.001):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    # Brendan Gregg's collapsed format - 'root;...;leaf count' per line, ready for flamegraph.pl or speedscope
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class ProfileStore:
+    # The last `keep` profiles: summary dict plus the .prof (pstats/snakeviz) and collapsed stack dumps
+    def __init__(self, keep):
+        self._profiles = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._lock = Lock()
+
+    def add(self, summary, prof, collapsed):
+        with self._lock:
+            summary = {'id': next(self._ids), **summary}
+            self._profiles.append((summary, prof, collapsed))
+        return summary['id']
+
+    def list(self):
+        with self._lock:
+            return [summary for summary, _, _ in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((entry for entry in self._profiles if entry[0]['id'] == profile_id), None)
+
+
+# before_request hook
+def start_profile():
+    if not wants_profile():
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler (e.g. a debugger) already owns this thread
+        return
+    g.profiler = profiler
+    g.profile_start = time.perf_counter()
+    g.profile_sampler = StackSampler(get_ident())
+    g.profile_sampler.start()
+
+
+# after_request hook - registered first so it runs last, after the commit
+def finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    sampler = g.pop('profile_sampler')
+    sampler.stop()
+    profiler.create_stats()
+    summary = {
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'durationMs': round((time.perf_counter() - g.pop('profile_start')) * 1000, 2),
+        'createdAt': datetime.now(timezone.utc),
+    }
+    profile_id = current_app.extensions['profiles'].add(summary, marshal.dumps(profiler.stats), sampler.collapsed())
+    response.headers['X-Profile-Id'] = str(profile_id)
+    return response
+
+
+# teardown hook - don't leave a profiler running on this thread if the request raised
+def abandon_profile(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        g.pop('profile_sampler').stop()
+
+
+# The innermost frame of our own code that led to a statement, e.g. 'app/auth.py:41 verify'
+def app_frame():
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and not filename.endswith(('metrics.py', 'profiling.py')):
+            return f'app/{os.path.relpath(filename, APP_DIR)}:{frame.f_lineno} {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+# Statements reading or writing the user table can carry tokens, password hashes and emails in their parameters
+USER_TABLE_STATEMENT = re.compile(r'\b(?:from|join|update|into)\s+"?user\b', re.IGNORECASE)
+
+
+# Parameters with each value replaced by its type (and length for strings and bytes), e.g. ('<str len=32>', '<int>')
+def redact_parameters(parameters):
+    if isinstance(parameters, dict):
+        return {key: redact_parameters(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(redact_parameters(value) for value in parameters)
+    if isinstance(parameters, (str, bytes)):
+        return f'<{type(parameters).__name__} len={len(parameters)}>'
+    return f'<{type(parameters).__name__}>'
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms, keep):
+        self.threshold = threshold_ms / 1000
+        self._queries = deque(maxlen=keep)
+        self._lock = Lock()
+
+    def record(self, statement, parameters, duration):
+        if USER_TABLE_STATEMENT.search(statement):
+            parameters = redact_parameters(parameters)
+        entry = {
+            'statement': statement,
+            # executemany parameter lists can be huge - the start is enough to reproduce the query
+            'parameters': repr(parameters)[:1000],
+            'durationMs': round(duration * 1000, 2),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'source': app_frame(),
+            'at': datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self._queries.append(entry)
+        current_app.logger.warning('Slow query (%.1f ms) from %s via %s: %s %s', entry['durationMs'], entry['endpoint'],
+                                   entry['source'], statement, entry['parameters'])
+
+    def list(self):
+        with self._lock:
+            return list(reversed(self._queries))
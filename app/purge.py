@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from threading import Thread
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import db
+from .models import User, Task, TaskChange, UNUSABLE_PASSWORD, add_task_delta, update_task_stats
+
+# Cleanup that's too big for one transaction - every step here deletes or updates at most PURGE_BATCH_SIZE rows and
+# commits, so no lock is held for long and a stopped run can simply be started again
+
+
+# Delete a locked-out user's tasks and change log chunk by chunk, then the user. Safe to re-run
+def purge_user(user_id, batch_size):
+    while True:
+        rows = db.session.execute(db.select(Task.id, Task.completed).where(Task.user_id == user_id).limit(batch_size)).all()
+        if not rows:
+            break
+        db.session.execute(db.delete(Task).where(Task.id.in_([row.id for row in rows])), execution_options={'synchronize_session': False})
+        deltas = {}
+        add_task_delta(deltas, user_id, -len(rows), -sum(1 for row in rows if row.completed))
+        update_task_stats(deltas)
+        # Drops the user's cached tasks and the cached task list pages once this chunk commits
+        db.session.info.setdefault('changed_users', set()).add(user_id)
+        db.session.commit()
+    while True:
+        seqs = db.session.scalars(db.select(TaskChange.seq).where(TaskChange.user_id == user_id).limit(batch_size)).all()
+        if not seqs:
+            break
+        db.session.execute(db.delete(TaskChange).where(TaskChange.seq.in_(seqs)), execution_options={'synchronize_session': False})
+        db.session.commit()
+    user = db.session.get(User, user_id)
+    if user is not None:
+        db.session.delete(user)
+        db.session.commit()
+
+
+def purge_user_in_background(app, user_id):
+    def run():
+        with app.app_context():
+            purge_user(user_id, app.config['PURGE_BATCH_SIZE'])
+
+    Thread(target=run, name=f'purge-user-{user_id}', daemon=True).start()
+
+
+# Users whose deletion was started but didn't finish (e.g. the process stopped part way)
+def pending_user_ids():
+    return db.session.scalars(db.select(User.id).where(User.password == UNUSABLE_PASSWORD)).all()
+
+
+# Start purging the users User.delete() locked out, once that's committed
+@event.listens_for(Session, 'after_commit')
+def start_user_purges(session):
+    user_ids = session.info.pop('purge_users', ())
+    if user_ids and has_app_context():
+        for user_id in user_ids:
+            purge_user_in_background(current_app._get_current_object(), user_id)
+
+
+# Clear expired tokens in batches of the oldest expired ones, found through ix_user_token_expiration - each cleared
+# batch drops out of that index, so no cursor is needed and users with live tokens are never read
+# Returns how many were cleared
+def purge_expired_tokens(batch_size):
+    now = datetime.now(timezone.utc)
+    cleared = 0
+    while True:
+        ids = db.session.scalars(db.select(User.id).where(User.token_expiration < now)
+                                 .order_by(User.token_expiration).limit(batch_size)).all()
+        if not ids:
+            break
+        # Checked again in case one of them logged in (and got a new token) since the SELECT
+        result = db.session.execute(db.update(User).where(User.id.in_(ids), User.token_expiration < now)
+                                    .values(token=None, token_expiration=None), execution_options={'synchronize_session': False})
+        db.session.commit()
+        cleared += result.rowcount
+    return cleared
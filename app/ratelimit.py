@@ -0,0 +1,119 @@
+import math
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from flask import current_app, g, request
+
+# Token-bucket rate limiting. Limits are per route name in RATE_LIMITS (e.g. {'create_task': '60/minute'}) and apply per
+# verified user - rate_limit sits under login_required, so it only ever sees credentials that have been checked - or
+# per IP for anonymous calls, with RATE_LIMIT_PER_IP as an extra cap on each IP across all limited routes. Failed
+# logins and bad tokens are counted per IP before anything is verified (RATE_LIMIT_AUTH_FAILURES), so neither making up
+# new usernames/tokens nor guessing one account's password gets past it, and one IP can't lock anyone else out.
+# Buckets live in a pluggable backend - in memory by default - so a limited request never costs a database query
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+# Backend interface - anything shared between processes (e.g. a small server holding the buckets) can implement consume()
+class RateLimitBackend:
+    def consume(self, key, rate, capacity, cost=1):
+        # Take cost tokens from the bucket for key, which refills at rate tokens/second up to capacity
+        # Returns (allowed, seconds until the request would be allowed)
+        raise NotImplementedError
+
+    def peek(self, key, rate, capacity, cost=1):
+        # Same answer as consume() but without taking anything from the bucket
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    # Buckets for this process only, least recently used ones dropped past maxsize (a dropped bucket just starts full again)
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._refill(key, rate, capacity, now)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (cost - tokens) / rate
+
+    def peek(self, key, rate, capacity, cost=1):
+        with self._lock:
+            tokens = self._refill(key, rate, capacity, time.monotonic())
+        return tokens >= cost, 0 if tokens >= cost else (cost - tokens) / rate
+
+    def _refill(self, key, rate, capacity, now):
+        tokens, last = self._buckets.get(key, (capacity, now))
+        return min(capacity, tokens + (now - last) * rate)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+# '30/minute' -> (0.5 tokens per second, bucket of 30)
+def parse_rate(limit):
+    count, _, period = limit.partition('/')
+    count = int(count)
+    return count / PERIODS[period.strip()], count
+
+
+# The user login_required verified (it's only set once the credentials have been checked), else the IP. Never the
+# credential itself - a made-up username or token would get a fresh bucket every time
+def client_key():
+    user = g.get('flask_httpauth_user')
+    if user is not None:
+        return f'user:{user.id}'
+    return f'ip:{request.remote_addr}'
+
+
+# Goes under login_required, e.g. @token_auth.login_required then @rate_limit('create_task')
+def rate_limit(name):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            limits = []
+            if current_app.config['RATE_LIMITS'].get(name):
+                limits.append((f'{name}:{client_key()}', current_app.config['RATE_LIMITS'][name]))
+            if current_app.config['RATE_LIMIT_PER_IP']:
+                limits.append((f'ip:{request.remote_addr}', current_app.config['RATE_LIMIT_PER_IP']))
+            backend = current_app.extensions['rate_limiter']
+            for key, limit in limits:
+                allowed, retry_after = backend.consume(key, *parse_rate(limit))
+                if not allowed:
+                    raise RateLimited(retry_after)
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+# Wraps an auth verify callback: an IP that has used up its RATE_LIMIT_AUTH_FAILURES gets a 429 before any password
+# is hashed or token looked up, and every failed attempt with a username/token is counted against the IP
+def limit_auth_failures(f):
+    @wraps(f)
+    def decorated(credential, *args):
+        limit = current_app.config['RATE_LIMIT_AUTH_FAILURES']
+        if not limit:
+            return f(credential, *args)
+        backend = current_app.extensions['rate_limiter']
+        key = f'auth-failures:ip:{request.remote_addr}'
+        allowed, retry_after = backend.peek(key, *parse_rate(limit))
+        if not allowed:
+            raise RateLimited(retry_after)
+        user = f(credential, *args)
+        if user is None and credential:
+            backend.consume(key, *parse_rate(limit))
+        return user
+    return decorated
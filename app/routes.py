@@ -1,19 +1,80 @@
-from flask import request, render_template
-from . import app, db 
-from .models import User, Task
+import csv
+import io
+import math
+import time
+from datetime import datetime, timezone
+from flask import Blueprint, current_app, request, render_template, Response, stream_with_context
+from sqlalchemy.orm import selectinload
+from . import db 
+from .models import User, Task, TaskChange, UserTaskStats, commit, record_task_changes, update_task_stats, changes_committed
 from .auth import basic_auth, token_auth
+from .cache import token_cache, response_cache
+from .routing import reads_use_replica
+from .passwords import HasherBusy
+from .ratelimit import rate_limit, RateLimited
+from .pagination import parse_bool, parse_date, parse_int, parse_limit, parse_sort, paginate, next_cursor, encode_cursor, decode_cursor
+from .search import match_clause, ranked_search, highlight
+from .conditional import as_utc, make_etag, has_conditions, is_not_modified, tag_response, not_modified
 
+# All of the API's routes - registered on the app in create_app
+bp = Blueprint('api', __name__)
+
+# Fields the task list can be sorted by (?sort=<field> or ?sort=-<field> for descending) - only ones with an index on
+# task behind them (alone and after completed), so a page costs the same however many tasks there are
+TASK_SORT_FIELDS = {'id': Task.id, 'createdAt': Task.createdAt, 'dueDate': Task.dueDate}
+# Fields every new task needs (single and bulk create)
+TASK_REQUIRED_FIELDS = ['title', 'description', 'dueDate']
+# Fields /users/me/tasks can be sorted by - each one is the tail of one of the (user_id, ...) indexes on task
+MY_TASK_SORT_FIELDS = {'id': Task.id, 'createdAt': Task.createdAt, 'dueDate': Task.dueDate}
+
+# ...............................
+
+# ERROR HANDLERS
+# Too many password hashes in flight - tell the client to back off instead of queueing up more CPU work
+@bp.app_errorhandler(HasherBusy)
+def handle_hasher_busy(e):
+    return {'error': 'The server is busy. Please try again shortly'}, 503, {'Retry-After': '1'}
+
+# Over a rate limit (see ratelimit.py)
+@bp.app_errorhandler(RateLimited)
+def handle_rate_limited(e):
+    return {'error': 'Too many requests. Please slow down'}, 429, {'Retry-After': str(math.ceil(e.retry_after))}
 # ...............................
 
 # HOME ENDPOINT
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 # ...............................
 
+# METRICS ENDPOINT - Prometheus text format
+@bp.route('/metrics')
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return {'error': 'Metrics are disabled'}, 404
+    token_stats = token_cache().stats()
+    extra = []
+    if token_stats is not None:
+        extra += [
+            ('token_cache_hits_total', 'counter', 'Token auth cache hits', token_stats['hits']),
+            ('token_cache_misses_total', 'counter', 'Token auth cache misses', token_stats['misses']),
+            ('token_cache_size', 'gauge', 'Tokens currently cached', token_stats['size']),
+        ]
+    if response_cache() is not None:
+        response_stats = response_cache().stats()
+        extra += [
+            ('response_cache_hits_total', 'counter', 'Task responses served from the response cache', response_stats['hits']),
+            ('response_cache_misses_total', 'counter', 'Task responses that had to be built from the database', response_stats['misses']),
+            ('response_cache_hit_ratio', 'gauge', 'Share of cacheable task reads served from the response cache', response_stats['ratio']),
+        ]
+    body = current_app.extensions['metrics'].render(extra)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+# ...............................
+
 # USER ENDPOINTS
 # Create New User
-@app.route('/users', methods=['POST'])
+@bp.route('/users', methods=['POST'])
+@rate_limit('create_user')
 def create_user():
     # Check to make sure requeset body is JSON
     if not request.is_json:
@@ -48,8 +109,9 @@ def create_user():
 
 
 # Delete User Endpoint
-@app.route('/users/<int:user_id>', methods=['DELETE'])
+@bp.route('/users/<int:user_id>', methods=['DELETE'])
 @token_auth.login_required
+@rate_limit('delete_user')
 def delete_user(user_id):
     #check if the user exists 
     user = db.session.get(User, user_id)
@@ -65,47 +127,357 @@ def delete_user(user_id):
     user.delete()
     return {'success':f"User '{user.first_name}' was deleted successfully"}, 200
 
-@app.route('/token')
+@bp.route('/token')
 @basic_auth.login_required
+@rate_limit('get_token')
 def get_token():
     user = basic_auth.current_user()
     return user.get_token()
 
 
-@app.route('/users/me')
+@bp.route('/users/me')
 @token_auth.login_required
 def get_me():
     user = token_auth.current_user()
-    return user.to_dict()
+    etag = make_etag('user', user.id, user.version)
+    if is_not_modified(etag, user.date_updated):
+        return not_modified(etag, user.date_updated)
+    return tag_response(user.to_dict(), etag, user.date_updated)
+
+
+# Get My Tasks - the signed in user's tasks, newest first by default. The filters and sorts line up with the
+# (user_id, completed, dueDate) and (user_id, createdAt, id) indexes on task, e.g. ?overdue=true&sort=dueDate or
+# ?completed=false&due_before=2024-06-30 is a single index range scan
+@bp.route('/users/me/tasks')
+@token_auth.login_required
+def get_my_tasks():
+    current_user = token_auth.current_user()
+    select_stmt = db.select(Task).where(Task.user_id == current_user.id)
+    try:
+        completed = parse_bool(request.args.get('completed'), 'completed')
+        # ?overdue=true - open tasks whose due date has passed
+        if parse_bool(request.args.get('overdue'), 'overdue'):
+            if completed:
+                raise ValueError('overdue tasks are never completed')
+            completed = False
+            select_stmt = select_stmt.where(Task.dueDate < datetime.now(timezone.utc).date())
+        if completed is not None:
+            select_stmt = select_stmt.where(Task.completed == completed)
+        due_after = parse_date(request.args.get('due_after'), 'due_after')
+        if due_after:
+            select_stmt = select_stmt.where(Task.dueDate >= due_after)
+        due_before = parse_date(request.args.get('due_before'), 'due_before')
+        if due_before:
+            select_stmt = select_stmt.where(Task.dueDate <= due_before)
+        sort_attr, sort_column, descending = parse_sort(request.args.get('sort'), MY_TASK_SORT_FIELDS, '-createdAt')
+        limit = parse_limit(request.args.get('limit'))
+        select_stmt = paginate(select_stmt, sort_column, Task.id, descending, limit, request.args.get('next'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    tasks, cursor = next_cursor(db.session.execute(select_stmt).scalars().all(), limit, sort_attr)
+    return {'tasks': [t.to_dict(author=False) for t in tasks], 'next': cursor}
+
+# ................................
+
+# STATS ENDPOINTS - task counts come from the user_task_stats counters, so neither endpoint reads the task rows,
+# apart from overdue. A task turns overdue just by the date changing, with no write to count it, so that one is an
+# index range count: over one user's open tasks (ix_task_user_id_completed_dueDate) for /users/me/stats, but over every
+# user's open tasks (ix_task_completed_dueDate_id) for /stats - that grows with the table, which is fine for an
+# admin-only endpoint but shouldn't be polled
+
+# Counts for the signed in user
+@bp.route('/users/me/stats')
+@token_auth.login_required
+def get_my_stats():
+    current_user = token_auth.current_user()
+    stats = db.session.get(UserTaskStats, current_user.id)
+    total, completed = (stats.total, stats.completed) if stats else (0, 0)
+    overdue = db.session.scalar(db.select(db.func.count()).select_from(Task)
+                                .where(Task.user_id == current_user.id, Task.completed == db.false(), Task.dueDate < datetime.now(timezone.utc).date()))
+    return {'total': total, 'completed': completed, 'open': total - completed, 'overdue': overdue}
+
 
+# Counts across every user - admins only
+@bp.route('/stats')
+@token_auth.login_required(role='admin')
+def get_stats():
+    users, total, completed = db.session.execute(db.select(db.func.count().filter(UserTaskStats.total > 0), db.func.coalesce(db.func.sum(UserTaskStats.total), 0),
+                                                           db.func.coalesce(db.func.sum(UserTaskStats.completed), 0))).one()
+    overdue = db.session.scalar(db.select(db.func.count()).select_from(Task)
+                                .where(Task.completed == db.false(), Task.dueDate < datetime.now(timezone.utc).date()))
+    return {'usersWithTasks': users, 'total': total, 'completed': completed, 'open': total - completed, 'overdue': overdue}
+# ................................
+
+# PROFILING ENDPOINTS - admins only (see profiling.py)
+
+# Recent request profiles, newest first
+@bp.route('/profiles')
+@token_auth.login_required(role='admin')
+def get_profiles():
+    return {'profiles': current_app.extensions['profiles'].list()}
+
+
+# Download a profile - 'prof' for pstats/snakeviz, 'collapsed' for flamegraph.pl/speedscope
+@bp.route('/profiles/<int:profile_id>/<any(prof, collapsed):kind>')
+@token_auth.login_required(role='admin')
+def download_profile(profile_id, kind):
+    entry = current_app.extensions['profiles'].get(profile_id)
+    if entry is None:
+        return {'error': f'A profile with the ID of {profile_id} does not exist (only the most recent ones are kept)'}, 404
+    if kind == 'prof':
+        return Response(entry[1], mimetype='application/octet-stream', headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.prof'})
+    return Response(entry[2], mimetype='text/plain')
+
+
+# Recent SQL statements slower than SLOW_QUERY_MS, newest first
+@bp.route('/slow-queries')
+@token_auth.login_required(role='admin')
+def get_slow_queries():
+    slow_queries = current_app.extensions.get('slow_queries')
+    return {'queries': slow_queries.list() if slow_queries else []}
 # ................................
 
 # TASK ENDPOINTS
 # Get All Tasks 
-@app.route('/tasks')
+@bp.route('/tasks')
 def get_all_tasks():
     select_stmt = db.select(Task)
-    search = request.args.get('search')
-    if search:
-        select_stmt = select_stmt.where(Task.title.ilike(f"%{search}%"))
-    # Get all tasks from the database
-    tasks =  db.session.execute(db.select(Task)).scalars().all()
-    return [t.to_dict() for t in tasks]
+    # Filters - all of these are applied in SQL so only the requested page is ever loaded
+    try:
+        search = request.args.get('search')
+        if search:
+            select_stmt = select_stmt.where(match_clause(search))
+        completed = parse_bool(request.args.get('completed'), 'completed')
+        if completed is not None:
+            select_stmt = select_stmt.where(Task.completed == completed)
+        user_id = parse_int(request.args.get('user_id'), 'user_id')
+        if user_id is not None:
+            select_stmt = select_stmt.where(Task.user_id == user_id)
+        due_after = parse_date(request.args.get('due_after'), 'due_after')
+        if due_after:
+            select_stmt = select_stmt.where(Task.dueDate >= due_after)
+        due_before = parse_date(request.args.get('due_before'), 'due_before')
+        if due_before:
+            select_stmt = select_stmt.where(Task.dueDate <= due_before)
+        # Sorting and keyset pagination
+        sort_attr, sort_column, descending = parse_sort(request.args.get('sort'), TASK_SORT_FIELDS, 'id')
+        limit = parse_limit(request.args.get('limit'))
+        select_stmt = paginate(select_stmt, sort_column, Task.id, descending, limit, request.args.get('next'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    # A page that was served since the last task write comes straight from the response cache (when it's turned on)
+    cache = response_cache()
+    if cache is not None:
+        page_key = cache.page_key(request.full_path)
+        entry = cache.get_page(page_key)
+        if entry is not None:
+            return cached_response(entry)
+    # For a conditional GET, first fetch just the ids/versions of the page - if the client's copy is current, answer 304
+    # without loading or serializing any tasks. Pages only get an ETag: a delete, or a task moving onto or off the page,
+    # changes the page without touching any updatedAt on it, so a Last-Modified would answer 304 for a changed page
+    if request.if_none_match:
+        versions = db.session.execute(select_stmt.join(Task.author).with_only_columns(Task.id, Task.version, User.version)).all()[:limit]
+        etag = task_list_etag(versions)
+        if is_not_modified(etag):
+            return not_modified(etag)
+    # Get the page of tasks from the database - authors are loaded with one extra IN query instead of one per task
+    select_stmt = select_stmt.options(selectinload(Task.author))
+    tasks = db.session.execute(select_stmt).scalars().all()
+    tasks, cursor = next_cursor(tasks, limit, sort_attr)
+    etag = task_list_etag([(t.id, t.version, t.author.version) for t in tasks])
+    # ?sideload=users returns each author once in a 'users' map instead of embedding it in every task
+    if request.args.get('sideload') == 'users':
+        users = {t.author.id: t.author.to_dict() for t in tasks}
+        entry = cache_entry({'tasks': [t.to_dict(author=False) for t in tasks], 'users': users, 'next': cursor}, etag, None)
+    else:
+        entry = cache_entry({'tasks': [t.to_dict() for t in tasks], 'next': cursor}, etag, None)
+    if can_fill_cache(cache):
+        cache.set_page(page_key, entry)
+    return cached_response(entry)
+
+
+# ETag for a page of tasks, from (task id, task version, author version) rows
+def task_list_etag(versions):
+    return make_etag(request.full_path, [tuple(row) for row in versions])
+
+
+# A task response changes when the task or its embedded author does
+def task_last_modified(task_updated, author_updated):
+    return max(as_utc(task_updated), as_utc(author_updated))
+
+
+# Response cache entries are the serialized JSON body plus the validators, so a hit costs no database or serializing work
+def cache_entry(body, etag, last_modified):
+    return current_app.json.dumps(body) + '\n', etag, last_modified
+
+
+def cached_response(entry):
+    body, etag, last_modified = entry
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
+    return tag_response(Response(body, mimetype='application/json'), etag, last_modified)
+
+
+# Don't cache what was read from a read replica - it may be older than a write that already invalidated the cache.
+# So with a replica configured, only clients pinned to the primary (right after a write) ever fill the cache
+def can_fill_cache(cache):
+    return cache is not None and not (current_app.config['SQLALCHEMY_BINDS'].get('read') and reads_use_replica())
+
+
+# Full-text Search Tasks - best matches first, with the matching words highlighted in an HTML-escaped snippet
+@bp.route('/tasks/search')
+def search_tasks():
+    search = request.args.get('q')
+    if not search:
+        return {'error': 'q must be in the query string'}, 400
+    try:
+        limit = parse_limit(request.args.get('limit'), maximum=100)
+        # Ranked results can't use a keyset, so the cursor is just the offset of the next page
+        offset = 0
+        if request.args.get('next'):
+            (offset,) = decode_cursor(request.args['next'], [Task.id])
+            if offset < 0:
+                raise ValueError('Invalid cursor')
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    select_stmt = ranked_search(search).options(selectinload(Task.author)).limit(limit + 1).offset(offset)
+    rows = db.session.execute(select_stmt).all()
+    cursor = encode_cursor(offset + limit) if len(rows) > limit else None
+    results = []
+    for task, rank, snippet in rows[:limit]:
+        task_dict = task.to_dict()
+        task_dict['rank'] = rank
+        task_dict['snippet'] = highlight(snippet)
+        results.append(task_dict)
+    return {'tasks': results, 'next': cursor}
+
+
+# Export All of Your Tasks - streamed as NDJSON or CSV in batches from a server-side cursor, so memory stays flat
+# no matter how many tasks there are and the first bytes go out straight away
+@bp.route('/tasks/export')
+@token_auth.login_required
+@rate_limit('export_tasks')
+def export_tasks():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return {'error': 'format must be ndjson or csv'}, 400
+    current_user = token_auth.current_user()
+    columns = [Task.id, Task.title, Task.description, Task.completed, Task.dueDate, Task.createdAt, Task.user_id.label('authorId')]
+    select_stmt = db.select(*columns).where(Task.user_id == current_user.id).order_by(Task.id) \
+        .execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+
+    def generate():
+        result = db.session.execute(select_stmt)
+        fields = list(result.keys())
+        if export_format == 'csv':
+            yield ','.join(fields) + '\r\n'
+        for rows in result.partitions():
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield ''.join(current_app.json.dumps({**row._asdict(), 'dueDate': row.dueDate.isoformat()}) + '\n' for row in rows)
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    headers = {'Content-Disposition': f'attachment; filename=tasks.{export_format}'}
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
+
+
+# Task Change Feed - everything that happened to your tasks after the ?since cursor, oldest first. Keep the returned
+# 'next' cursor and pass it back as ?since to get only newer changes. ?wait=<seconds> long-polls until something changes.
+# Changes are committed in seq order (see TaskChange), so nothing can show up later below a cursor already handed out
+@bp.route('/tasks/changes')
+@token_auth.login_required
+def get_task_changes():
+    current_user = token_auth.current_user()
+    try:
+        since = 0
+        if request.args.get('since'):
+            (since,) = decode_cursor(request.args['since'], [TaskChange.seq])
+        limit = parse_limit(request.args.get('limit'))
+        wait = min(request.args.get('wait', 0, type=float), current_app.config['CHANGES_MAX_WAIT'])
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    select_stmt = db.select(TaskChange).where(TaskChange.user_id == current_user.id, TaskChange.seq > since).order_by(TaskChange.seq).limit(limit + 1)
+    changes = db.session.execute(select_stmt).scalars().all()
+    deadline = time.monotonic() + wait
+    while not changes and time.monotonic() < deadline:
+        # Wake up on a commit in this process, or re-check every second for writes from other processes
+        with changes_committed:
+            changes_committed.wait(min(1, deadline - time.monotonic()))
+        db.session.rollback()  # end the read transaction so the next query sees new commits
+        changes = db.session.execute(select_stmt).scalars().all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    # Current state of every task that still exists, loaded in one query
+    task_ids = {change.task_id for change in changes if change.op != 'delete'}
+    tasks = {}
+    if task_ids:
+        tasks = {t.id: t for t in db.session.execute(db.select(Task).where(Task.id.in_(task_ids))).scalars()}
+    results = []
+    for change in changes:
+        change_dict = change.to_dict()
+        task = tasks.get(change.task_id)
+        change_dict['task'] = task.to_dict(author=False) if task is not None and change.op != 'delete' else None
+        results.append(change_dict)
+    cursor = encode_cursor(changes[-1].seq if changes else since)
+    return {'changes': results, 'next': cursor, 'hasMore': has_more}
 
 
 # Get Task by Specific ID 
-@app.route('/tasks/<int:task_id>')
+@bp.route('/tasks/<int:task_id>')
 def get_task_by_id(task_id):
+    cache = response_cache()
+    if cache is not None:
+        entry = cache.get_task(task_id)
+        if entry is not None:
+            return cached_response(entry)
+        generation = cache.generation()
+    # For a conditional GET, check the task's (and its author's) version with one indexed lookup before loading anything
+    if has_conditions():
+        versions = db.session.execute(db.select(Task.version, User.version, Task.updatedAt, User.date_updated).join(Task.author).where(Task.id == task_id)).one_or_none()
+        if versions is not None:
+            etag = make_etag('task', task_id, versions[0], versions[1])
+            last_modified = task_last_modified(versions[2], versions[3])
+            if is_not_modified(etag, last_modified):
+                return not_modified(etag, last_modified)
     # Get the tasks from where they are stored in DB
     task = db.session.get(Task, task_id)
     # For each dict in the list, if the key of 'id' matches the task_id from the URL, return that task
     if task:
-        return task.to_dict()
+        etag = make_etag('task', task.id, task.version, task.author.version)
+        entry = cache_entry(task.to_dict(), etag, task_last_modified(task.updatedAt, task.author.date_updated))
+        if can_fill_cache(cache):
+            cache.set_task(task.id, task.user_id, entry, generation)
+        return cached_response(entry)
     return {'error': f'A task with the ID of {task_id} does not exist'}, 404 
 
+# The task fields from a request body, checked and converted - raises ValueError naming the first bad one.
+# Unlike the query string filters none of them can be null
+def clean_task_fields(data):
+    fields = {key: value for key, value in data.items() if key in Task.allowed_fields}
+    for key in ('title', 'description'):
+        if key in fields and not isinstance(fields[key], str):
+            raise ValueError(f'{key} must be a string')
+    if 'completed' in fields and not isinstance(fields['completed'], bool):
+        raise ValueError('completed must be true or false')
+    if 'dueDate' in fields:
+        if not isinstance(fields['dueDate'], str):
+            raise ValueError('dueDate must be a date in YYYY-MM-DD format')
+        fields['dueDate'] = parse_date(fields['dueDate'], 'dueDate')
+    return fields
+
+
+# JSON true/false are ints to Python, but not task ids
+def is_task_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
 #Create new task
-@app.route('/tasks', methods=['POST'])
+@bp.route('/tasks', methods=['POST'])
 @token_auth.login_required
+@rate_limit('create_task')
 def create_task():
     # Check if the request object body is JSON
     if not request.is_json:
@@ -114,7 +486,7 @@ def create_task():
     data = request.json 
     # Want to set it up where each task must have a title & body 
     # Valide the incoming data - first write out required fields, and check against it
-    required_fields = ['title', 'description', 'dueDate']
+    required_fields = TASK_REQUIRED_FIELDS
     missing_fields = []
     for field in required_fields:
         if field not in data:
@@ -124,9 +496,13 @@ def create_task():
     # the code block above is ensuring title, desc, and duedate are all in the post req body, in json format. From there, we can GET that data and add it to our dict
 
     # Get data values
-    title = data.get('title')
-    description = data.get('description')
-    dueDate = data.get('dueDate')
+    try:
+        fields = clean_task_fields(data)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    title = fields['title']
+    description = fields['description']
+    dueDate = fields['dueDate']
 
     current_user = token_auth.current_user() # will return User instance, and can then grab id attribute 
 
@@ -137,8 +513,9 @@ def create_task():
 
 
 # Update Tasks Endpoint
-@app.route('/tasks/<int:task_id>', methods=['PUT'])
+@bp.route('/tasks/<int:task_id>', methods=['PUT'])
 @token_auth.login_required
+@rate_limit('edit_task')
 def edit_task(task_id):
     # Check to see that they have a json body
     if not request.is_json:
@@ -155,13 +532,18 @@ def edit_task(task_id):
     
     # Get data from Request:
     data = request.json
+    try:
+        fields = clean_task_fields(data)
+    except ValueError as e:
+        return {'error': str(e)}, 400
     # Pass that data into the task's update method
-    task.update(**data)
+    task.update(**fields)
     return task.to_dict() 
 
 # Delete Task Endpoint
-@app.route('/tasks/<int:task_id>', methods=['DELETE'])
+@bp.route('/tasks/<int:task_id>', methods=['DELETE'])
 @token_auth.login_required
+@rate_limit('delete_task')
 def delete_task(task_id):
     #check if the task exists 
     task = db.session.get(Task, task_id)
@@ -175,4 +557,156 @@ def delete_task(task_id):
     
     # delete task, calling delete method 
     task.delete()
-    return {'success':f'{task.title} was deleted successfully'}, 200
\ No newline at end of file
+    return {'success':f'{task.title} was deleted successfully'}, 200
+
+
+# ................................
+
+# BULK TASK ENDPOINTS
+# Each one validates every item with the same rules as the single-task routes, writes all the valid items
+# with a single executemany in one transaction, and reports a result (index, status, id/error) for every item
+
+# Pull the list of items out of the body - either a bare JSON array or {"<key>": [...]}
+def get_bulk_items(key):
+    if not request.is_json:
+        return None, ({'error': 'Your content-type must be application/json'}, 400)
+    data = request.json
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list):
+        return None, ({'error': f'The request body must be a list or an object with a "{key}" list'}, 400)
+    max_items = current_app.config['BULK_MAX_ITEMS']
+    if len(data) > max_items:
+        return None, ({'error': f'A bulk request can have at most {max_items} items'}, 400)
+    return data, None
+
+
+# Look up the owner (and completed flag, for the stats counters) of every id with set-based queries
+# (chunked to stay under the database's bound-parameter limit) - returns {id: (user_id, completed)}
+def get_task_owners(task_ids):
+    owners = {}
+    task_ids = list(set(task_ids))
+    for i in range(0, len(task_ids), 500):
+        chunk = task_ids[i:i + 500]
+        owners.update((row.id, (row.user_id, row.completed)) for row in db.session.execute(db.select(Task.id, Task.user_id, Task.completed).where(Task.id.in_(chunk))))
+    return owners
+
+
+# Bulk Create Tasks
+@bp.route('/tasks/bulk', methods=['POST'])
+@token_auth.login_required
+@rate_limit('bulk_create_tasks')
+def bulk_create_tasks():
+    items, error = get_bulk_items('tasks')
+    if error:
+        return error
+    current_user = token_auth.current_user()
+    results = [None] * len(items)
+    rows = []
+    positions = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 400, 'error': 'Each task must be an object'}
+            continue
+        missing_fields = [field for field in TASK_REQUIRED_FIELDS if field not in item]
+        if missing_fields:
+            results[index] = {'index': index, 'status': 400, 'error': f"{', '.join(missing_fields)} must be in the request body"}
+            continue
+        try:
+            fields = clean_task_fields(item)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 400, 'error': str(e)}
+            continue
+        rows.append({'title': fields['title'], 'description': fields['description'], 'dueDate': fields['dueDate'], 'user_id': current_user.id})
+        positions.append(index)
+    if rows:
+        # SQLite hands out rowids in insert order under its single-writer lock, so sorting the returned ids gives back parameter
+        # order - asking SQLAlchemy to sort_by_parameter_order there would fall back to one INSERT per row
+        if db.session.get_bind().dialect.name == 'sqlite':
+            new_ids = sorted(db.session.scalars(db.insert(Task).returning(Task.id), rows).all())
+        else:
+            new_ids = db.session.scalars(db.insert(Task).returning(Task.id, sort_by_parameter_order=True), rows).all()
+        for index, task_id in zip(positions, new_ids):
+            results[index] = {'index': index, 'status': 201, 'id': task_id}
+        record_task_changes('create', [(task_id, current_user.id) for task_id in new_ids])
+        update_task_stats({current_user.id: (len(new_ids), 0)})
+        commit()
+    return {'results': results}, 200
+
+
+# Bulk Update Tasks
+@bp.route('/tasks/bulk', methods=['PATCH'])
+@token_auth.login_required
+@rate_limit('bulk_update_tasks')
+def bulk_update_tasks():
+    items, error = get_bulk_items('tasks')
+    if error:
+        return error
+    current_user = token_auth.current_user()
+    owners = get_task_owners(item['id'] for item in items if isinstance(item, dict) and is_task_id(item.get('id')))
+    results = []
+    rows = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not is_task_id(item.get('id')):
+            results.append({'index': index, 'status': 400, 'error': 'Each task must be an object with an integer id'})
+            continue
+        task_id = item['id']
+        if task_id not in owners:
+            results.append({'index': index, 'status': 404, 'id': task_id, 'error': f'A task with the ID of {task_id} does not exist'})
+            continue
+        if owners[task_id][0] != current_user.id:
+            results.append({'index': index, 'status': 403, 'id': task_id, 'error': "This is not your task. You do not have permission to edit"})
+            continue
+        try:
+            changes = clean_task_fields(item)
+        except ValueError as e:
+            results.append({'index': index, 'status': 400, 'id': task_id, 'error': str(e)})
+            continue
+        if changes:
+            rows.append({'id': task_id, **changes})
+        results.append({'index': index, 'status': 200, 'id': task_id})
+    if rows:
+        db.session.execute(db.update(Task), rows)
+        record_task_changes('update', [(row['id'], current_user.id) for row in rows])
+        # Rows are applied in order, so a task listed twice flips from whatever the previous row left it at
+        completed = {task_id: owner[1] for task_id, owner in owners.items()}
+        flips = 0
+        for row in rows:
+            if 'completed' in row:
+                flips += int(bool(row['completed'])) - int(bool(completed[row['id']]))
+                completed[row['id']] = row['completed']
+        update_task_stats({current_user.id: (0, flips)})
+        commit()
+    return {'results': results}, 200
+
+
+# Bulk Delete Tasks
+@bp.route('/tasks/bulk', methods=['DELETE'])
+@token_auth.login_required
+@rate_limit('bulk_delete_tasks')
+def bulk_delete_tasks():
+    items, error = get_bulk_items('ids')
+    if error:
+        return error
+    current_user = token_auth.current_user()
+    owners = get_task_owners(task_id for task_id in items if is_task_id(task_id))
+    results = []
+    deletable = set()
+    for index, task_id in enumerate(items):
+        if not is_task_id(task_id):
+            results.append({'index': index, 'status': 400, 'error': 'Each id must be an integer'})
+        elif task_id not in owners:
+            results.append({'index': index, 'status': 404, 'id': task_id, 'error': 'This task does not exist'})
+        elif owners[task_id][0] != current_user.id:
+            results.append({'index': index, 'status': 403, 'id': task_id, 'error': 'You do not have permission to delete this task'})
+        else:
+            deletable.add(task_id)
+            results.append({'index': index, 'status': 200, 'id': task_id})
+    if deletable:
+        deletable = list(deletable)
+        for i in range(0, len(deletable), 500):
+            db.session.execute(db.delete(Task).where(Task.id.in_(deletable[i:i + 500])))
+        record_task_changes('delete', [(task_id, current_user.id) for task_id in deletable])
+        update_task_stats({current_user.id: (-len(deletable), -sum(1 for task_id in deletable if owners[task_id][1]))})
+        commit()
+    return {'results': results}, 200
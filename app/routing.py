@@ -0,0 +1,61 @@
+import hashlib
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+
+# Read/write routing - when a 'read' bind is configured (DATABASE_READ_URL), SELECTs issued while handling a GET/HEAD
+# request go to it and everything else goes to the primary. A client that just wrote is pinned to the primary for
+# READ_YOUR_WRITES_SECONDS, so it never reads back an older copy of its own change from a lagging replica
+
+STICKY_COOKIE = 'read_primary_until'
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                # A flush or an INSERT/UPDATE/DELETE - remember it so the client gets pinned to the primary
+                self.info['wrote'] = True
+            elif isinstance(clause, Select) and 'read' in self._db.engines and reads_use_replica():
+                return self._db.engines['read']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Who to pin besides the cookie - only the credentials, since one address can be a whole office behind NAT (or every
+# client, behind a proxy) and pinning it would send all of them to the primary
+def client_keys():
+    if 'Authorization' in request.headers:
+        return ['auth:' + hashlib.sha1(request.headers['Authorization'].encode()).hexdigest()]
+    return []
+
+
+# Decided once per request
+def reads_use_replica():
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    if 'read_replica' not in g:
+        g.read_replica = not is_sticky()
+    return g.read_replica
+
+
+def is_sticky():
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    pinned = current_app.extensions['read_your_writes']
+    return any(pinned.get(key) for key in client_keys())
+
+
+# after_request hook - pin a client that just wrote to the primary (in this process, and via a cookie for the others)
+def pin_writers(response, session):
+    if session.info.pop('wrote', False) and response.status_code < 400 and current_app.config['SQLALCHEMY_BINDS'].get('read'):
+        window = current_app.config['READ_YOUR_WRITES_SECONDS']
+        pinned = current_app.extensions['read_your_writes']
+        for key in client_keys():
+            pinned.set(key, True, ttl=window)
+        response.set_cookie(STICKY_COOKIE, str(time.time() + window), max_age=int(window) + 1, httponly=True)
+    return response
@@ -0,0 +1,107 @@
+import html
+import re
+from sqlalchemy import event, DDL
+from . import db
+from .models import Task
+
+# Full-text search over task titles and descriptions
+# SQLite - an external-content FTS5 table (task_fts) kept in sync with triggers on task
+# Postgres - a GIN index on to_tsvector(title || ' ' || description), which the database keeps up to date itself
+# Anything else falls back to a (non-indexable) ILIKE scan
+
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(title, description, content='task', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_ad AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_au AFTER UPDATE OF title, description ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+POSTGRES_FTS_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_task_fts ON task USING gin (to_tsvector('english', title || ' ' || description))",
+]
+
+# Set the index up whenever the task table is created with db.create_all() (migrations do the same for existing databases)
+for statement in SQLITE_FTS_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRES_FTS_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+task_fts = db.table('task_fts', db.column('rowid'), db.column('title'), db.column('description'))
+
+# Only word characters make it into the query so user input can never inject FTS syntax
+def search_terms(search):
+    return re.findall(r'\w+', search)
+
+
+def dialect_name():
+    return db.engine.dialect.name
+
+
+def tsvector():
+    return db.func.to_tsvector('english', Task.title + ' ' + Task.description)
+
+
+# A query matching every term as a prefix, e.g. "gro mil" finds "groceries: milk"
+def prefix_query(terms):
+    if dialect_name() == 'sqlite':
+        return ' '.join(f'"{term}"*' for term in terms)
+    return db.func.to_tsquery('english', ' & '.join(f'{term}:*' for term in terms))
+
+
+# WHERE clause for /tasks?search=... that uses the full-text index
+def match_clause(search):
+    terms = search_terms(search)
+    if not terms:
+        return db.false()
+    dialect = dialect_name()
+    if dialect == 'sqlite':
+        return Task.id.in_(db.select(task_fts.c.rowid).where(db.literal_column('task_fts').match(prefix_query(terms))))
+    if dialect == 'postgresql':
+        return tsvector().op('@@')(prefix_query(terms))
+    return db.and_(*[db.or_(Task.title.ilike(f'%{term}%'), Task.description.ilike(f'%{term}%')) for term in terms])
+
+
+# The database marks matches with these (private use characters, so never anything HTML cares about) - highlight()
+# swaps them for <mark></mark> once the rest of the snippet has been escaped
+MARK_START = '\ue000'
+MARK_STOP = '\ue001'
+
+
+# A snippet as safe HTML - the task text escaped, only the matches wrapped in <mark></mark>
+def highlight(snippet):
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_STOP, '</mark>')
+
+
+# Ranked search - returns a select of (Task, rank, snippet) rows, best match first, with matches between
+# MARK_START/MARK_STOP (see highlight())
+def ranked_search(search):
+    terms = search_terms(search)
+    dialect = dialect_name()
+    if dialect == 'sqlite':
+        fts = db.literal_column('task_fts')
+        rank = db.func.bm25(fts)  # lower is better
+        snippet = db.func.snippet(fts, -1, MARK_START, MARK_STOP, '…', 12)
+        select_stmt = db.select(Task, (-rank).label('rank'), snippet.label('snippet')) \
+            .join_from(task_fts, Task, Task.id == task_fts.c.rowid) \
+            .where(fts.match(prefix_query(terms))) \
+            .order_by(rank, Task.id)
+    elif dialect == 'postgresql':
+        query = prefix_query(terms)
+        rank = db.func.ts_rank(tsvector(), query)
+        snippet = db.func.ts_headline('english', Task.title + ' ' + Task.description, query, f'StartSel={MARK_START}, StopSel={MARK_STOP}')
+        select_stmt = db.select(Task, rank.label('rank'), snippet.label('snippet')) \
+            .where(tsvector().op('@@')(query)) \
+            .order_by(rank.desc(), Task.id)
+    else:
+        select_stmt = db.select(Task, db.literal(0).label('rank'), Task.title.label('snippet')) \
+            .where(match_clause(search)) \
+            .order_by(Task.id)
+    if not terms:
+        select_stmt = select_stmt.where(db.false())
+    return select_stmt
@@ -0,0 +1,197 @@
+# Benchmark harness - drives the API routes at a configurable concurrency and prints a JSON report
+# (p50/p95/p99 latency, throughput and SQL queries per request) that can be diffed between commits.
+#
+# Seed data first, then run against the Flask test client (in-process, uses DATABASE_URL):
+#   flask seed --users 1000 --tasks 1000000
+#   python -m benchmarks.run --requests 2000 --concurrency 8 --out before.json
+# or against a running server (start it with SERVER_TIMING=true to get query counts, and loose RATE_LIMITS):
+#   python -m benchmarks.run --url http://127.0.0.1:5000 --scenarios get_all_tasks,create_task
+
+import argparse
+import base64
+import json
+import os
+import re
+import secrets
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+QUERY_COUNT = re.compile(r'desc="(\d+) queries"')
+
+
+class TestClientTransport:
+    # Sends requests through Flask's test client - one client per thread
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        return self.app.test_client()
+
+    def request(self, client, method, path, headers=None, json_body=None):
+        response = client.open(path, method=method, headers=headers, json=json_body)
+        return response.status_code, response.headers, response.get_json(silent=True)
+
+
+class HTTPTransport:
+    # Sends requests to a live server with urllib
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def client(self):
+        return None
+
+    def request(self, client, method, path, headers=None, json_body=None):
+        headers = dict(headers or {})
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as response:
+                body = response.read()
+                status, response_headers = response.status, response.headers
+        except urllib.error.HTTPError as e:
+            body, status, response_headers = e.read(), e.code, e.headers
+        try:
+            body = json.loads(body)
+        except ValueError:
+            body = None
+        return status, response_headers, body
+
+
+def basic_header(username, password):
+    return {'Authorization': 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()}
+
+
+# Create a user (and some tasks) for the benchmark run to own
+def setup(transport):
+    client = transport.client()
+    username = f'bench_{secrets.token_hex(4)}'
+    user = {'firstName': 'Bench', 'lastName': 'Mark', 'username': username, 'email': f'{username}@example.com', 'password': 'bench'}
+    transport.request(client, 'POST', '/users', json_body=user)
+    _, _, body = transport.request(client, 'GET', '/token', headers=basic_header(username, 'bench'))
+    token_header = {'Authorization': f"Bearer {body['token']}"}
+    # Half of them overdue, so the due date filters have something to find
+    tasks = [{'title': f'Bench task {n}', 'description': 'benchmark', 'dueDate': '2020-01-01' if n % 2 else '2030-01-01'} for n in range(200)]
+    _, _, body = transport.request(client, 'POST', '/tasks/bulk', headers=token_header, json_body=tasks)
+    task_ids = [result['id'] for result in body['results']]
+    return {'username': username, 'token_header': token_header, 'task_ids': task_ids}
+
+
+# scenario name -> function(context, i) returning (method, path, headers, json body)
+SCENARIOS = {
+    'index': lambda ctx, i: ('GET', '/', None, None),
+    'get_all_tasks': lambda ctx, i: ('GET', '/tasks?limit=50', None, None),
+    'get_all_tasks_filtered': lambda ctx, i: ('GET', '/tasks?completed=false&sort=-createdAt&limit=50', None, None),
+    'search_tasks': lambda ctx, i: ('GET', '/tasks/search?q=bench', None, None),
+    'get_task_by_id': lambda ctx, i: ('GET', f"/tasks/{ctx['task_ids'][i % len(ctx['task_ids'])]}", None, None),
+    'get_me': lambda ctx, i: ('GET', '/users/me', ctx['token_header'], None),
+    'get_my_tasks': lambda ctx, i: ('GET', '/users/me/tasks?limit=50', ctx['token_header'], None),
+    'get_my_overdue_tasks': lambda ctx, i: ('GET', '/users/me/tasks?overdue=true&sort=dueDate&limit=50', ctx['token_header'], None),
+    'get_token': lambda ctx, i: ('GET', '/token', basic_header(ctx['username'], 'bench'), None),
+    'create_task': lambda ctx, i: ('POST', '/tasks', ctx['token_header'], {'title': f'Bench {i}', 'description': 'benchmark', 'dueDate': '2030-01-01'}),
+    'edit_task': lambda ctx, i: ('PUT', f"/tasks/{ctx['task_ids'][i % len(ctx['task_ids'])]}", ctx['token_header'], {'completed': i % 2 == 0}),
+    'get_task_changes': lambda ctx, i: ('GET', '/tasks/changes?limit=50', ctx['token_header'], None),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def run_scenario(transport, context, name, requests, concurrency):
+    build = SCENARIOS[name]
+
+    def worker(worker_id):
+        client = transport.client()
+        samples = []
+        for i in range(worker_id, requests, concurrency):
+            method, path, headers, body = build(context, i)
+            start = time.perf_counter()
+            status, response_headers, _ = transport.request(client, method, path, headers=headers, json_body=body)
+            elapsed = time.perf_counter() - start
+            match = QUERY_COUNT.search(response_headers.get('Server-Timing', '') or '')
+            samples.append((elapsed, status, int(match.group(1)) if match else None))
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = [sample for worker_samples in pool.map(worker, range(concurrency)) for sample in worker_samples]
+    wall_time = time.perf_counter() - start
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[1] >= 400),
+        'throughput_rps': round(len(samples) / wall_time, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'mean': round(sum(latencies) / len(latencies), 3),
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the task API routes')
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process Flask test client)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--out', help='Also write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    if args.url:
+        transport = HTTPTransport(args.url)
+    else:
+        os.environ.setdefault('SERVER_TIMING', 'true')
+        from app import create_app
+        app = create_app()
+        app.config['SERVER_TIMING'] = True
+        app.config['RATE_LIMITS'] = {}
+        app.config['RATE_LIMIT_PER_IP'] = None
+        transport = TestClientTransport(app)
+
+    context = setup(transport)
+    report = {
+        'commit': git_commit(),
+        'target': args.url or 'test-client',
+        'requests_per_scenario': args.requests,
+        'concurrency': args.concurrency,
+        'scenarios': {name: run_scenario(transport, context, name, args.requests, args.concurrency) for name in names},
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
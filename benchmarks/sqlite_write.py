@@ -0,0 +1,47 @@
+# Concurrent write benchmark - runs the same POST /tasks load against a fresh SQLite database under each
+# performance profile and prints the throughput/latency side by side, e.g.
+#   python -m benchmarks.sqlite_write --requests 2000 --concurrency 8
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from config import profiles
+from .run import TestClientTransport, setup, run_scenario
+
+
+def bench_profile(profile, requests, concurrency, directory):
+    from app import create_app, db
+
+    class BenchConfig(profiles[profile]):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, f'{profile}.db')
+        SERVER_TIMING = True
+        RATE_LIMITS = {}
+        RATE_LIMIT_PER_IP = None
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    transport = TestClientTransport(app)
+    context = setup(transport)
+    result = run_scenario(transport, context, 'create_task', requests, concurrency)
+    with app.app_context():
+        db.engine.dispose()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare concurrent POST /tasks throughput across SQLite profiles')
+    parser.add_argument('--profiles', default='development,sqlite-prod', help='Comma-separated profiles to compare')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per profile')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = {profile: bench_profile(profile, args.requests, args.concurrency, directory) for profile in args.profiles.split(',')}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,4 +4,139 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite.///' + os.path.join(basedir, 'app.db')
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'app.db')
+    # Extra create_engine() arguments (pool sizing etc.) and PRAGMAs run on every new SQLite connection - see the profiles below
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    # SQLite doesn't enforce foreign keys unless asked to, on every connection - without it a task written while its user
+    # is being purged (see app/purge.py) would outlive them
+    SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+    # Optional read replica - SELECTs made by GET requests go here (see app/routing.py), falls back to the primary when unset
+    SQLALCHEMY_BINDS = {'read': os.environ['DATABASE_READ_URL']} if os.environ.get('DATABASE_READ_URL') else {}
+    # How long (seconds) a client that just wrote keeps reading from the primary instead of the replica
+    READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+    # Werkzeug password hash method/parameters, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000' - existing hashes are
+    # upgraded the next time their user logs in. Hashing runs on PASSWORD_HASH_WORKERS threads, with at most
+    # PASSWORD_HASH_QUEUE more logins waiting before /token answers 503
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+    # Token-bucket rate limits per route (see app/ratelimit.py) - count/second|minute|hour|day per client (the verified
+    # user, or IP when anonymous). RATE_LIMIT_PER_IP additionally caps each IP across all of those routes, and
+    # RATE_LIMIT_AUTH_FAILURES caps failed logins/bad tokens per IP
+    RATE_LIMITS = {
+        'get_token': '10/minute',
+        'create_user': '5/minute',
+        'delete_user': '5/minute',
+        'create_task': '60/minute',
+        'edit_task': '120/minute',
+        'delete_task': '120/minute',
+        'bulk_create_tasks': '10/minute',
+        'bulk_update_tasks': '10/minute',
+        'bulk_delete_tasks': '10/minute',
+        'export_tasks': '5/minute',
+    }
+    RATE_LIMIT_PER_IP = os.environ.get('RATE_LIMIT_PER_IP', '600/minute')
+    RATE_LIMIT_AUTH_FAILURES = os.environ.get('RATE_LIMIT_AUTH_FAILURES', '10/minute')
+    # Where buckets are kept - import path of a RateLimitBackend subclass. MemoryBackend keeps them in each process, so
+    # under gunicorn (gunicorn.conf.py starts 2 x CPUs + 1 workers) every limit is really the limit times the number of
+    # workers - use a backend shared by all workers, or divide the limits by the worker count
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'app.ratelimit:MemoryBackend')
+    # How many reverse proxies in front of the app set X-Forwarded-For. Per-IP limits (and everything else that looks
+    # at the client address) use request.remote_addr, which behind a proxy is the proxy's address unless this is set -
+    # all clients would share one IP bucket. Only set it when there really is a proxy, or clients can pick their own IP
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    # Token auth cache - import path of a CacheBackend, how many tokens to remember and for how long (seconds) before
+    # re-checking the database. Rotating a token or deleting a user only clears it from this process's cache (unless the
+    # backend is shared between processes), so the other workers keep accepting the old token for up to the TTL
+    TOKEN_CACHE_BACKEND = os.environ.get('TOKEN_CACHE_BACKEND', 'app.cache:TTLCache')
+    TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 5))
+    # Usernames allowed to use the admin-only endpoints (e.g. GET /stats), comma separated
+    ADMIN_USERNAMES = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}
+    # Task response cache - import path of a CacheBackend, how many responses to keep and for how long (seconds).
+    # Off by default. A write only invalidates entries in the backend of the process that committed it, so use a backend
+    # shared by every worker - 'app.cache:TTLCache' is per process and only correct with a single worker (other workers
+    # would serve, and 304, the old body until the TTL runs out). With a read replica (DATABASE_READ_URL) only reads
+    # from the primary are cached, so most GETs won't fill it
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', '')
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 10000))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+    # 'request' - models stage their changes and each request commits once at the end (or rolls back on error)
+    # 'immediate' - every save()/update()/delete() commits straight away
+    DB_TRANSACTION_MODE = os.environ.get('DB_TRANSACTION_MODE', 'request')
+    # Most items accepted by one /tasks/bulk request
+    BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 5000))
+    # Users with more tasks than this are locked out straight away and deleted in chunks in the background (0 - always delete in the request)
+    USER_DELETE_BACKGROUND_THRESHOLD = int(os.environ.get('USER_DELETE_BACKGROUND_THRESHOLD', 10000))
+    # Rows per transaction for background user deletes and `flask purge-tokens`
+    PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+    # Rows fetched per round trip when streaming /tasks/export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    # Longest a /tasks/changes?wait=<seconds> long-poll may hold the request open
+    CHANGES_MAX_WAIT = float(os.environ.get('CHANGES_MAX_WAIT', 30))
+    # Add a Server-Timing header (total, SQL and auth time) to every response
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+    # Serve request metrics in the Prometheus text format at /metrics
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # Signs the X-Profile header (`flask profile-token` makes one) - without it only PROFILE_SAMPLE_RATE profiles requests
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    # Share of requests to profile with cProfile (0-1), how many profiles to keep and how long a signed header stays valid
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+    # SQL statements slower than this (milliseconds) are logged and kept for GET /slow-queries (0 - off)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+    SLOW_QUERY_KEEP = int(os.environ.get('SLOW_QUERY_KEEP', 100))
+
+
+# PERFORMANCE PROFILES - pick one with APP_PROFILE=development|sqlite-prod|postgres-prod (default development)
+
+class DevelopmentConfig(Config):
+    # Library defaults - rollback journal SQLite, default pool
+    pass
+
+
+class SQLiteProductionConfig(Config):
+    # WAL lets readers carry on while a write is in progress and makes commits much cheaper (synchronous=NORMAL only
+    # fsyncs at checkpoints - still crash safe in WAL mode). busy_timeout makes concurrent writers wait for the lock
+    # instead of failing straight away, and the bigger page cache + mmap keep hot pages out of read() calls
+    SQLITE_PRAGMAS = {
+        **Config.SQLITE_PRAGMAS,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 268435456,  # 256MB
+        'cache_size': -64000,  # 64MB (negative = KiB)
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 10,
+        'pool_timeout': 10,
+    }
+
+
+class PostgresProductionConfig(Config):
+    # Sized for a few threaded workers per host - pool_size * workers must stay under the server's max_connections.
+    # pre_ping drops connections the server (or a proxy) closed, recycle stops them from going stale in the first place
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 10,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+
+profiles = {
+    'development': DevelopmentConfig,
+    'sqlite-prod': SQLiteProductionConfig,
+    'postgres-prod': PostgresProductionConfig,
+}
+
+
+def get_config(profile=None):
+    profile = profile or os.environ.get('APP_PROFILE', 'development')
+    if profile not in profiles:
+        raise ValueError(f"Unknown APP_PROFILE {profile!r} - choose from {', '.join(profiles)}")
+    return profiles[profile]
@@ -0,0 +1,10 @@
+import multiprocessing
+import os
+
+# Build the app once in the master and fork workers from it, so they share the imported code and start quickly.
+# create_app disposes inherited database connections in each forked worker
+preload_app = True
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# Each worker has its own in-memory rate limit buckets and caches - see RATE_LIMIT_BACKEND in config.py
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
@@ -0,0 +1,52 @@
+"""task full-text search
+
+Revision ID: 3f1c7d2b8e41
+Revises: 9a5c26cfb242
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c7d2b8e41'
+down_revision = '9a5c26cfb242'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # External-content FTS5 index over task, kept in sync by triggers
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(title, description, content='task', content_rowid='id')")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS task_fts_ai AFTER INSERT ON task BEGIN
+            INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS task_fts_ad AFTER DELETE ON task BEGIN
+            INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS task_fts_au AFTER UPDATE OF title, description ON task BEGIN
+            INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""")
+        # Backfill the index from the rows already in task
+        op.execute("INSERT INTO task_fts(task_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        # Building the GIN index indexes every existing row - CONCURRENTLY keeps task writable meanwhile, and can't
+        # run inside a transaction
+        with op.get_context().autocommit_block():
+            op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_task_fts ON task USING gin (to_tsvector('english', title || ' ' || description))")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS task_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS task_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS task_fts_ai")
+        op.execute("DROP TABLE IF EXISTS task_fts")
+    elif dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_task_fts")
@@ -0,0 +1,27 @@
+"""index user.token_expiration for purging expired tokens
+
+Revision ID: a6d3e8f15c72
+Revises: f4c1a7e93b20
+Create Date: 2026-10-18 17:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3e8f15c72'
+down_revision = 'f4c1a7e93b20'
+branch_labels = None
+depends_on = None
+
+
+# CONCURRENTLY on Postgres, so logins (which write token_expiration) carry on during the build
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_user_token_expiration', 'user', ['token_expiration'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_token_expiration', table_name='user', postgresql_concurrently=True)
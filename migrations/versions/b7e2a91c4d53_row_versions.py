@@ -0,0 +1,39 @@
+"""row versions for conditional GETs
+
+Revision ID: b7e2a91c4d53
+Revises: 3f1c7d2b8e41
+Create Date: 2026-10-18 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2a91c4d53'
+down_revision = '3f1c7d2b8e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite can only ADD COLUMN ... NOT NULL with a constant default, so add the columns with a placeholder
+    # timestamp and then backfill them from the creation dates
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('date_updated', sa.DateTime(), nullable=False, server_default='1970-01-01 00:00:00'))
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updatedAt', sa.DateTime(), nullable=False, server_default='1970-01-01 00:00:00'))
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    op.execute('UPDATE "user" SET date_updated = date_created')
+    op.execute('UPDATE task SET "updatedAt" = "createdAt"')
+
+
+def downgrade():
+    # Plain DROP COLUMN (SQLite 3.35+) rather than batch mode, which would rebuild task and lose the full-text triggers
+    op.drop_column('task', 'version')
+    op.drop_column('task', 'updatedAt')
+    op.drop_column('user', 'version')
+    op.drop_column('user', 'date_updated')
@@ -0,0 +1,36 @@
+"""task change log
+
+Revision ID: c41d8f0e2a67
+Revises: b7e2a91c4d53
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8f0e2a67'
+down_revision = 'b7e2a91c4d53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task_change',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(), nullable=False),
+    sa.Column('changedAt', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    with op.batch_alter_table('task_change', schema=None) as batch_op:
+        batch_op.create_index('ix_task_change_user_id_seq', ['user_id', 'seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('task_change', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_change_user_id_seq')
+
+    op.drop_table('task_change')
@@ -0,0 +1,110 @@
+"""typed task due dates and per-user task indexes
+
+Revision ID: d85a3e6f1b92
+Revises: c41d8f0e2a67
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd85a3e6f1b92'
+down_revision = 'c41d8f0e2a67'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# Formats the free-form dueDate strings have been seen in, tried in order after ISO (the docs used to show 01/02/2024)
+LEGACY_FORMATS = ['%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%Y/%m/%d', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y']
+
+# Rebuilding task in batch mode (SQLite) drops its triggers, so the full-text ones from 3f1c7d2b8e41 are put back after
+SQLITE_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS task_fts_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_ad AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_au AFTER UPDATE OF title, description ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+task = sa.table('task', sa.column('id', sa.Integer), sa.column('dueDate', sa.String), sa.column('dueDate_parsed', sa.Date))
+
+
+def parse_due_date(value):
+    value = (value or '').strip()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        pass
+    for fmt in LEGACY_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def recreate_fts_triggers():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
+
+
+# SQLite DDL isn't transactional, so a batch rebuild that failed part way leaves its temporary table behind
+def drop_leftover_batch_table():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS _alembic_tmp_task')
+
+
+def upgrade():
+    # Parse the strings into a new column first. The backfill commits batch by batch and only looks at rows that haven't
+    # been parsed yet, so if it's interrupted (or stops on unparseable dates) running the upgrade again picks up where it left off
+    if 'dueDate_parsed' not in {column['name'] for column in sa.inspect(op.get_bind()).get_columns('task')}:
+        op.add_column('task', sa.Column('dueDate_parsed', sa.Date(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        last_id = 0
+        while True:
+            rows = connection.execute(sa.select(task.c.id, task.c.dueDate).where(task.c.id > last_id, task.c.dueDate_parsed.is_(None))
+                                      .order_by(task.c.id).limit(BATCH_SIZE)).all()
+            if not rows:
+                break
+            parsed = [{'task_id': row.id, 'parsed': parse_due_date(row.dueDate)} for row in rows]
+            parsed = [row for row in parsed if row['parsed'] is not None]
+            if parsed:
+                connection.execute(task.update().where(task.c.id == sa.bindparam('task_id')).values(dueDate_parsed=sa.bindparam('parsed')), parsed)
+            last_id = rows[-1].id
+
+    unparsed = op.get_bind().execute(sa.select(task.c.id, task.c.dueDate).where(task.c.dueDate_parsed.is_(None)).order_by(task.c.id).limit(20)).all()
+    if unparsed:
+        examples = ', '.join(f'{row.id}: {row.dueDate!r}' for row in unparsed)
+        raise RuntimeError(f'Some task due dates could not be parsed - fix them (as YYYY-MM-DD) and run the upgrade again. First few: {examples}')
+
+    drop_leftover_batch_table()
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('dueDate')
+        batch_op.alter_column('dueDate_parsed', new_column_name='dueDate', existing_type=sa.Date(), nullable=False)
+    recreate_fts_triggers()
+    op.create_index('ix_task_user_id_completed_dueDate', 'task', ['user_id', 'completed', 'dueDate'], unique=False)
+    op.create_index('ix_task_user_id_createdAt_id', 'task', ['user_id', 'createdAt', 'id'], unique=False)
+
+
+def downgrade():
+    op.add_column('task', sa.Column('dueDate_text', sa.String(), nullable=True))
+    op.execute('UPDATE task SET "dueDate_text" = CAST("dueDate" AS VARCHAR)')
+    op.drop_index('ix_task_user_id_createdAt_id', table_name='task')
+    op.drop_index('ix_task_user_id_completed_dueDate', table_name='task')
+    drop_leftover_batch_table()
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('dueDate')
+        batch_op.alter_column('dueDate_text', new_column_name='dueDate', existing_type=sa.String(), nullable=False)
+    recreate_fts_triggers()
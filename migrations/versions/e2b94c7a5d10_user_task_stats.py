@@ -0,0 +1,34 @@
+"""per-user task counters
+
+Revision ID: e2b94c7a5d10
+Revises: d85a3e6f1b92
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b94c7a5d10'
+down_revision = 'd85a3e6f1b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_task_stats',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Same GROUP BY as `flask reconcile-stats`
+    op.execute('INSERT INTO user_task_stats (user_id, total, completed) '
+               'SELECT user_id, COUNT(*), SUM(CASE WHEN completed THEN 1 ELSE 0 END) FROM task GROUP BY user_id')
+    op.create_index('ix_task_completed_dueDate', 'task', ['completed', 'dueDate'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_completed_dueDate', table_name='task')
+    op.drop_table('user_task_stats')
@@ -0,0 +1,40 @@
+"""indexes behind every task list sort
+
+Revision ID: f4c1a7e93b20
+Revises: e2b94c7a5d10
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c1a7e93b20'
+down_revision = 'e2b94c7a5d10'
+branch_labels = None
+depends_on = None
+
+# (completed, dueDate, id) replaces (completed, dueDate) - same prefix, plus the keyset tiebreaker
+INDEXES = [
+    ('ix_task_createdAt_id', ['createdAt', 'id']),
+    ('ix_task_dueDate_id', ['dueDate', 'id']),
+    ('ix_task_completed_id', ['completed', 'id']),
+    ('ix_task_completed_createdAt_id', ['completed', 'createdAt', 'id']),
+    ('ix_task_completed_dueDate_id', ['completed', 'dueDate', 'id']),
+]
+
+
+# On Postgres the indexes are built CONCURRENTLY (outside a transaction) so writes to task carry on during the build
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'task', columns, unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_task_completed_dueDate', table_name='task', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_task_completed_dueDate', 'task', ['completed', 'dueDate'], unique=False, postgresql_concurrently=True)
+        for name, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='task', postgresql_concurrently=True)
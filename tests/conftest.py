@@ -0,0 +1,56 @@
+import pytest
+from app import create_app, db
+from config import Config
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_BINDS = {}
+    # Cheap hashes and no rate limits - the tests create users and hit the same routes many times
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
+    RATE_LIMITS = {}
+    RATE_LIMIT_PER_IP = None
+    RATE_LIMIT_AUTH_FAILURES = None
+    RESPONSE_CACHE_BACKEND = ''
+    SLOW_QUERY_MS = 0
+
+
+# Builds apps on a SQLite file in the test's temp directory - apps made with the same `database` share it, like two
+# workers (or hosts) pointed at one database
+@pytest.fixture
+def make_app(tmp_path):
+    def make_app(database='app.db', **config):
+        config_class = type('AppTestConfig', (TestingConfig,), {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / database}', **config})
+        app = create_app(config_class)
+        with app.app_context():
+            # Only the primary - db.metadatas is shared by every app, so a replica bind one test configured would
+            # otherwise be created (and missing) in all the tests after it
+            db.create_all(bind_key=None)
+        return app
+    return make_app
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Create a user and return the Authorization header for their token
+def sign_up(client, username, password='pw'):
+    response = client.post('/users', json={'firstName': 'Test', 'lastName': 'User', 'username': username,
+                                           'email': f'{username}@example.com', 'password': password})
+    assert response.status_code == 201, response.json
+    response = client.get('/token', auth=(username, password))
+    assert response.status_code == 200, response.json
+    return {'Authorization': f"Bearer {response.json['token']}"}
+
+
+def make_task(client, headers, title='Task', due_date='2030-01-01', **fields):
+    response = client.post('/tasks', headers=headers, json={'title': title, 'description': 'Description', 'dueDate': due_date, **fields})
+    assert response.status_code == 201, response.json
+    return response.json['id']
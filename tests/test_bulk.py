@@ -0,0 +1,92 @@
+from .conftest import sign_up, make_task
+
+VALID = {'title': 'Task', 'description': 'Description', 'dueDate': '2030-01-01'}
+
+
+def statuses(response):
+    assert response.status_code == 200, response.json
+    return [(result['status'], result.get('error')) for result in response.json['results']]
+
+
+def test_bulk_create_reports_each_item(client):
+    headers = sign_up(client, 'alice')
+    response = client.post('/tasks/bulk', headers=headers, json={'tasks': [
+        VALID,
+        'not an object',
+        {'title': 'Task'},
+        {**VALID, 'title': None},
+        {**VALID, 'description': 5},
+        {**VALID, 'dueDate': None},
+        {**VALID, 'dueDate': '01/02/2030'},
+        {**VALID, 'title': 'Second'},
+    ]})
+    assert statuses(response) == [
+        (201, None),
+        (400, 'Each task must be an object'),
+        (400, 'description, dueDate must be in the request body'),
+        (400, 'title must be a string'),
+        (400, 'description must be a string'),
+        (400, 'dueDate must be a date in YYYY-MM-DD format'),
+        (400, 'dueDate must be a date in YYYY-MM-DD format'),
+        (201, None),
+    ]
+    results = response.json['results']
+    assert [result['index'] for result in results] == list(range(8))
+    assert client.get(f"/tasks/{results[7]['id']}").json['title'] == 'Second'
+    assert len(client.get('/tasks').json['tasks']) == 2
+
+
+def test_bulk_update_reports_each_item(client):
+    alice = sign_up(client, 'alice')
+    bob = sign_up(client, 'bob')
+    mine = make_task(client, alice)
+    theirs = make_task(client, bob)
+    response = client.patch('/tasks/bulk', headers=alice, json={'tasks': [
+        {'id': mine, 'title': 'Edited', 'completed': True},
+        {'id': theirs, 'title': 'Edited'},
+        {'id': 999999, 'title': 'Edited'},
+        {'id': True, 'title': 'Edited'},
+        {'id': str(mine), 'title': 'Edited'},
+        {'id': mine, 'completed': 'yes'},
+        {'id': mine, 'title': None},
+        {'id': mine, 'dueDate': 'tomorrow'},
+    ]})
+    assert statuses(response) == [
+        (200, None),
+        (403, 'This is not your task. You do not have permission to edit'),
+        (404, 'A task with the ID of 999999 does not exist'),
+        (400, 'Each task must be an object with an integer id'),
+        (400, 'Each task must be an object with an integer id'),
+        (400, 'completed must be true or false'),
+        (400, 'title must be a string'),
+        (400, 'dueDate must be a date in YYYY-MM-DD format'),
+    ]
+    task = client.get(f'/tasks/{mine}').json
+    assert (task['title'], task['completed'], task['dueDate']) == ('Edited', True, '2030-01-01')
+    assert client.get(f'/tasks/{theirs}').json['title'] == 'Task'
+
+
+def test_bulk_delete_reports_each_item(client):
+    alice = sign_up(client, 'alice')
+    bob = sign_up(client, 'bob')
+    mine = make_task(client, alice)
+    theirs = make_task(client, bob)
+    response = client.delete('/tasks/bulk', headers=alice, json={'ids': [mine, theirs, 999999, True, 'x']})
+    assert statuses(response) == [
+        (200, None),
+        (403, 'You do not have permission to delete this task'),
+        (404, 'This task does not exist'),
+        (400, 'Each id must be an integer'),
+        (400, 'Each id must be an integer'),
+    ]
+    assert client.get(f'/tasks/{mine}').status_code == 404
+    assert client.get(f'/tasks/{theirs}').status_code == 200
+
+
+def test_single_task_writes_check_types(client):
+    headers = sign_up(client, 'alice')
+    assert client.post('/tasks', headers=headers, json={**VALID, 'title': 1}).json == {'error': 'title must be a string'}
+    task_id = make_task(client, headers)
+    response = client.put(f'/tasks/{task_id}', headers=headers, json={'completed': None})
+    assert response.status_code == 400
+    assert response.json == {'error': 'completed must be true or false'}
@@ -0,0 +1,56 @@
+import time
+from .conftest import sign_up, make_task
+
+
+def change_list(response):
+    assert response.status_code == 200, response.json
+    return [(change['op'], change['taskId']) for change in response.json['changes']]
+
+
+def test_changes_since_cursor(client):
+    headers = sign_up(client, 'alice')
+    ids = [make_task(client, headers, title=f'Task {i}') for i in range(6)]
+    response = client.get('/tasks/changes?limit=4', headers=headers)
+    assert change_list(response) == [('create', task_id) for task_id in ids[:4]]
+    assert response.json['hasMore'] is True
+    since = response.json['next']
+
+    client.put(f'/tasks/{ids[0]}', headers=headers, json={'completed': True})
+    client.delete(f'/tasks/{ids[1]}', headers=headers)
+    response = client.get(f'/tasks/changes?since={since}', headers=headers)
+    assert change_list(response) == [('create', ids[4]), ('create', ids[5]), ('update', ids[0]), ('delete', ids[1])]
+    assert response.json['hasMore'] is False
+    # Current state for live tasks, nothing for deleted ones
+    assert response.json['changes'][2]['task']['completed'] is True
+    assert response.json['changes'][3]['task'] is None
+
+    response = client.get(f"/tasks/changes?since={response.json['next']}", headers=headers)
+    assert response.json['changes'] == []
+
+
+def test_bulk_writes_are_logged(client):
+    headers = sign_up(client, 'alice')
+    tasks = [{'title': f'Task {i}', 'description': 'Description', 'dueDate': '2030-01-01'} for i in range(3)]
+    ids = [result['id'] for result in client.post('/tasks/bulk', headers=headers, json={'tasks': tasks}).json['results']]
+    client.patch('/tasks/bulk', headers=headers, json={'tasks': [{'id': ids[0], 'title': 'Edited'}]})
+    client.delete('/tasks/bulk', headers=headers, json={'ids': [ids[1]]})
+    assert change_list(client.get('/tasks/changes', headers=headers)) == [('create', task_id) for task_id in ids] + [('update', ids[0]), ('delete', ids[1])]
+
+
+def test_only_your_own_changes(client):
+    alice = sign_up(client, 'alice')
+    bob = sign_up(client, 'bob')
+    make_task(client, alice)
+    bobs = make_task(client, bob)
+    assert change_list(client.get('/tasks/changes', headers=bob)) == [('create', bobs)]
+
+
+def test_wait_returns_empty_after_the_timeout(client):
+    headers = sign_up(client, 'alice')
+    make_task(client, headers)
+    since = client.get('/tasks/changes', headers=headers).json['next']
+    start = time.monotonic()
+    response = client.get(f'/tasks/changes?since={since}&wait=0.3', headers=headers)
+    assert response.json['changes'] == []
+    assert response.json['next'] == since
+    assert time.monotonic() - start >= 0.3
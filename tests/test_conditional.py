@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+from app import db
+from app.models import User
+from .conftest import sign_up, make_task
+
+
+def test_task_etag_and_last_modified(client):
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers)
+    response = client.get(f'/tasks/{task_id}')
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+    assert client.get(f'/tasks/{task_id}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/tasks/{task_id}', headers={'If-Modified-Since': last_modified}).status_code == 304
+    client.put(f'/tasks/{task_id}', headers=headers, json={'title': 'Edited'})
+    assert client.get(f'/tasks/{task_id}', headers={'If-None-Match': etag}).status_code == 200
+
+
+# A delete changes the page without touching any row left on it, so pages are only validated by ETag
+def test_list_page_is_validated_by_etag_only(client):
+    headers = sign_up(client, 'alice')
+    first = make_task(client, headers)
+    make_task(client, headers)
+    response = client.get('/tasks')
+    assert 'Last-Modified' not in response.headers
+    etag = response.headers['ETag']
+    assert client.get('/tasks', headers={'If-None-Match': etag}).status_code == 304
+    client.delete(f'/tasks/{first}', headers=headers)
+    response = client.get('/tasks', headers={'If-None-Match': etag, 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
+    assert len(response.json['tasks']) == 1
+    assert client.get('/tasks', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}).status_code == 200
+
+
+def expire_tokens(app):
+    with app.app_context():
+        db.session.execute(db.update(User).values(token_expiration=datetime.now(timezone.utc) - timedelta(minutes=5)))
+        db.session.commit()
+
+
+# Token rotation and the token purge don't change anything in a task response, so its ETag still matches
+def test_token_changes_keep_task_etags(client, app):
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers)
+    etag = client.get(f'/tasks/{task_id}').headers['ETag']
+
+    expire_tokens(app)
+    assert 'Cleared 1 expired tokens' in app.test_cli_runner().invoke(args=['purge-tokens']).output
+    assert client.get(f'/tasks/{task_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    # ...and neither does getting a new one
+    client.get('/token', auth=('alice', 'pw'))
+    expire_tokens(app)
+    client.get('/token', auth=('alice', 'pw'))
+    assert client.get(f'/tasks/{task_id}', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        assert db.session.scalar(db.select(User.version).where(User.username == 'alice')) == 1
+
+
+def test_author_change_changes_task_etag(client, app):
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers)
+    etag = client.get(f'/tasks/{task_id}').headers['ETag']
+    with app.app_context():
+        user = db.session.scalar(db.select(User).where(User.username == 'alice'))
+        user.first_name = 'Alicia'
+        db.session.commit()
+        assert user.version == 2
+    response = client.get(f'/tasks/{task_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['author']['firstName'] == 'Alicia'
@@ -0,0 +1,40 @@
+import csv
+import io
+import json
+from .conftest import sign_up, make_task
+
+
+def test_export_ndjson(make_app):
+    # A small batch size, so the export spans several round trips
+    client = make_app(EXPORT_BATCH_SIZE=2).test_client()
+    headers = sign_up(client, 'alice')
+    ids = [make_task(client, headers, title=f'Task {i}', due_date=f'2030-01-0{i + 1}') for i in range(5)]
+    make_task(client, sign_up(client, 'bob'))
+    response = client.get('/tasks/export', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=tasks.ndjson'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row['id'] for row in rows] == ids
+    assert rows[0]['title'] == 'Task 0'
+    assert rows[0]['dueDate'] == '2030-01-01'
+    assert rows[0]['completed'] is False
+    assert {row['authorId'] for row in rows} == {rows[0]['authorId']}
+
+
+def test_export_csv(client):
+    headers = sign_up(client, 'alice')
+    make_task(client, headers, title='Commas, "quotes" and\nnewlines')
+    make_task(client, headers, title='Plain')
+    response = client.get('/tasks/export?format=csv', headers=headers)
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == ['id', 'title', 'description', 'completed', 'dueDate', 'createdAt', 'authorId']
+    assert [row['title'] for row in rows] == ['Commas, "quotes" and\nnewlines', 'Plain']
+
+
+def test_export_needs_a_known_format_and_a_token(client):
+    headers = sign_up(client, 'alice')
+    assert client.get('/tasks/export?format=xml', headers=headers).json == {'error': 'format must be ndjson or csv'}
+    assert client.get('/tasks/export').status_code == 401
+    assert client.get('/tasks/export', headers=headers).text == ''
@@ -0,0 +1,38 @@
+import gc
+import os
+from app import apps, db
+
+
+def pooled_connections(app):
+    with app.app_context():
+        return db.engine.pool.checkedin()
+
+
+# A forked worker starts with an empty pool instead of sharing the parent's SQLite/Postgres connections
+def test_forked_child_drops_inherited_connections(app, client):
+    client.get('/tasks')
+    assert pooled_connections(app) > 0
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_fd, str(pooled_connections(app)).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    child_count = os.read(read_fd, 16).decode()
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    assert child_count == '0'
+    # The parent keeps its own
+    assert pooled_connections(app) > 0
+
+
+# The fork hook only holds apps weakly, so building apps (as the tests do) doesn't keep them all alive
+def test_apps_are_forgotten_once_unused(make_app):
+    app = make_app()
+    assert app in apps
+    count = len(apps)
+    del app
+    gc.collect()
+    assert len(apps) == count - 1
@@ -0,0 +1,46 @@
+import re
+import pytest
+from .conftest import sign_up, make_task
+
+
+def metric(body, name, **labels):
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    series = f'{name}{{{label_text}}}' if labels else name
+    match = re.search(rf'^{re.escape(series)} (\S+)$', body, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_metrics_count_requests_and_queries(client):
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers)
+    for _ in range(3):
+        client.get(f'/tasks/{task_id}')
+    client.get('/tasks/999999')
+    body = client.get('/metrics').text
+    assert metric(body, 'http_requests_total', endpoint='api.get_task_by_id', status=200) == 3
+    assert metric(body, 'http_requests_total', endpoint='api.get_task_by_id', status=404) == 1
+    assert metric(body, 'http_request_duration_seconds_count', endpoint='api.get_task_by_id') == 4
+    # The task and its author - one statement each at most
+    assert metric(body, 'http_request_sql_queries_bucket', endpoint='api.get_task_by_id', le=2) == 4
+    assert metric(body, 'http_request_auth_duration_seconds_count', endpoint='api.create_task') == 1
+    assert metric(body, 'token_cache_misses_total') >= 1
+
+
+def test_metrics_count_exceptions(make_app):
+    app = make_app()
+    app.add_url_rule('/boom', 'boom', lambda: 1 / 0)
+    client = app.test_client()
+    with pytest.raises(ZeroDivisionError):
+        client.get('/boom')
+    assert metric(client.get('/metrics').text, 'http_request_exceptions_total', endpoint='boom') == 1
+
+
+def test_metrics_can_be_turned_off(make_app):
+    assert make_app(METRICS_ENABLED=False).test_client().get('/metrics').status_code == 404
+
+
+def test_server_timing_header(make_app):
+    assert 'Server-Timing' not in make_app().test_client().get('/tasks').headers
+    client = make_app(SERVER_TIMING=True).test_client()
+    timing = client.get('/tasks').headers['Server-Timing']
+    assert re.fullmatch(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="1 queries", auth;dur=[\d.]+', timing)
@@ -0,0 +1,112 @@
+import base64
+import json
+import pytest
+from app import db
+from app.models import Task
+from app.pagination import paginate
+from app.routes import TASK_SORT_FIELDS
+from .conftest import sign_up, make_task
+
+
+def cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip('=')
+
+
+# Follow 'next' cursors until the last page, returning every task id in order
+def walk(client, path, headers=None):
+    ids = []
+    url = path
+    while True:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.json
+        ids += [task['id'] for task in response.json['tasks']]
+        if response.json['next'] is None:
+            return ids
+        url = f"{path}&next={response.json['next']}"
+
+
+@pytest.fixture
+def tasks(client):
+    headers = sign_up(client, 'alice')
+    # Repeated due dates, so the id tiebreaker matters
+    due_dates = ['2030-01-03', '2030-01-01', '2030-01-02', '2030-01-01', '2030-01-03', '2030-01-02', '2030-01-01']
+    ids = [make_task(client, headers, title=f'Task {i}', due_date=due_date) for i, due_date in enumerate(due_dates)]
+    return headers, list(zip(ids, due_dates))
+
+
+def test_pages_by_id(client, tasks):
+    _, rows = tasks
+    ids = [task_id for task_id, _ in rows]
+    assert walk(client, '/tasks?limit=2') == sorted(ids)
+    assert walk(client, '/tasks?limit=3&sort=-id') == sorted(ids, reverse=True)
+
+
+def test_pages_by_due_date(client, tasks):
+    _, rows = tasks
+    assert walk(client, '/tasks?limit=2&sort=dueDate') == [task_id for task_id, _ in sorted(rows, key=lambda row: (row[1], row[0]))]
+    assert walk(client, '/tasks?limit=2&sort=-dueDate') == [task_id for task_id, _ in sorted(rows, key=lambda row: (row[1], row[0]), reverse=True)]
+
+
+def test_pages_my_tasks(client, tasks):
+    headers, rows = tasks
+    sign_up(client, 'bob')
+    assert walk(client, '/users/me/tasks?limit=2&sort=-createdAt', headers) == sorted((task_id for task_id, _ in rows), reverse=True)
+    assert walk(client, '/users/me/tasks?limit=3&sort=dueDate&completed=false', headers) == [task_id for task_id, _ in sorted(rows, key=lambda row: (row[1], row[0]))]
+
+
+@pytest.mark.parametrize('path', [
+    '/tasks?next=not-a-cursor',
+    f'/tasks?next={cursor(None)}',
+    f'/tasks?next={cursor("1")}',
+    f'/tasks?next={cursor(True)}',
+    f'/tasks?next={cursor(1.5)}',
+    f'/tasks?next={cursor(1, 2)}',
+    f'/tasks?sort=dueDate&next={cursor(None, 1)}',
+    f'/tasks?sort=dueDate&next={cursor("soon", 1)}',
+    f'/tasks?sort=dueDate&next={cursor(20300101, 1)}',
+    f'/tasks?sort=dueDate&next={cursor(3, 1)}',
+    f'/users/me/tasks?sort=createdAt&next={cursor("2030-01-01", None)}',
+    f'/tasks/changes?since={cursor(None)}',
+    f'/tasks/changes?since={cursor("1")}',
+    f'/tasks/changes?since={cursor(False)}',
+    f'/tasks/search?q=task&next={cursor(True)}',
+    f'/tasks/search?q=task&next={cursor(-1)}',
+])
+def test_invalid_cursor_is_a_400(client, tasks, path):
+    headers, _ = tasks
+    response = client.get(path, headers=headers)
+    assert response.status_code == 400
+    assert response.json == {'error': 'Invalid cursor'}
+
+
+# Every allowed sort, with and without ?completed, reads the page straight off an index - no sorting the whole table
+@pytest.mark.parametrize('sort', sorted(TASK_SORT_FIELDS))
+@pytest.mark.parametrize('completed', [None, False])
+@pytest.mark.parametrize('descending', [False, True])
+def test_task_list_sorts_use_an_index(app, sort, completed, descending):
+    select_stmt = db.select(Task)
+    if completed is not None:
+        select_stmt = select_stmt.where(Task.completed == completed)
+    sort_column = TASK_SORT_FIELDS[sort]
+    select_stmt = paginate(select_stmt, sort_column, Task.id, descending, 50, cursor(*([1] if sort == 'id' else ['2030-01-01', 1])))
+    with app.app_context():
+        sql = str(select_stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' / '.join(row[3] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+    assert 'TEMP B-TREE' not in plan
+    if completed is not None or sort != 'id':
+        assert 'USING INDEX' in plan or 'USING COVERING INDEX' in plan
+
+
+def test_unindexed_sort_is_a_400(client):
+    assert client.get('/tasks?sort=title').status_code == 400
+
+
+def test_filters_are_checked(client, tasks):
+    headers, rows = tasks
+    assert len(client.get('/tasks?user_id=1').json['tasks']) == len(rows)
+    assert client.get('/tasks?user_id=2').json['tasks'] == []
+    for query, error in [('user_id=abc', 'user_id must be an integer'), ('completed=maybe', 'completed must be true or false'),
+                         ('due_after=soon', 'due_after must be a date in YYYY-MM-DD format')]:
+        response = client.get(f'/tasks?{query}')
+        assert response.status_code == 400
+        assert response.json == {'error': error}
@@ -0,0 +1,72 @@
+import threading
+import pytest
+from app import db
+from app.models import User
+from app.passwords import PasswordHasher, HasherBusy
+from .conftest import sign_up
+
+
+def stored_hash(app, username):
+    with app.app_context():
+        return db.session.scalar(db.select(User.password).where(User.username == username))
+
+
+def test_login_upgrades_old_hashes(make_app):
+    old_app = make_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:1')
+    sign_up(old_app.test_client(), 'alice')
+    assert stored_hash(old_app, 'alice').startswith('pbkdf2:sha256:1$')
+
+    new_app = make_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:2')
+    client = new_app.test_client()
+    assert client.get('/token', auth=('alice', 'wrong')).status_code == 401
+    assert stored_hash(new_app, 'alice').startswith('pbkdf2:sha256:1$')
+    assert client.get('/token', auth=('alice', 'pw')).status_code == 200
+    assert stored_hash(new_app, 'alice').startswith('pbkdf2:sha256:2$')
+    # ...and the upgraded hash still works
+    assert client.get('/token', auth=('alice', 'pw')).status_code == 200
+
+
+def test_unknown_user_is_rejected(client):
+    sign_up(client, 'alice')
+    response = client.get('/token', auth=('nobody', 'pw'))
+    assert response.status_code == 401
+    assert response.json == client.get('/token', auth=('alice', 'wrong')).json
+
+
+# With every pool slot taken, logins are turned away straight away instead of queueing
+def test_busy_hasher_answers_503(make_app):
+    app = make_app(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    client = app.test_client()
+    sign_up(client, 'alice')
+    hasher = app.extensions['password_hasher']
+    assert hasher._slots.acquire(blocking=False)
+    try:
+        response = client.get('/token', auth=('alice', 'pw'))
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        # An unknown username does the same work, so it waits for the same pool
+        assert client.get('/token', auth=('nobody', 'pw')).status_code == 503
+    finally:
+        hasher._slots.release()
+    assert client.get('/token', auth=('alice', 'pw')).status_code == 200
+
+
+# A hash we stopped waiting for is a 503 (not a 500), and keeps its slot until it has actually finished
+def test_slow_hash_times_out_and_keeps_its_slot():
+    hasher = PasswordHasher('pbkdf2:sha256:1', workers=1, queue_size=0, timeout=0.05)
+    finish = threading.Event()
+    with pytest.raises(HasherBusy):
+        hasher._run(finish.wait)
+    with pytest.raises(HasherBusy):
+        hasher.hash('pw')
+    finish.set()
+    # The pool has one thread, so once this has run the stuck job is done and its slot released
+    hasher._executor.submit(lambda: None).result()
+    assert hasher.verify(hasher.hash('pw'), 'pw')
+
+
+def test_unknown_user_checks_a_hash_made_with_the_current_method():
+    hasher = PasswordHasher('pbkdf2:sha256:2')
+    assert hasher._dummy_hash.startswith('pbkdf2:sha256:2$')
+    assert hasher.canonical_method() == 'pbkdf2:sha256:2'
+    assert hasher.verify_unknown_user('pw') is False
@@ -0,0 +1,45 @@
+import pytest
+from app import db
+from config import DevelopmentConfig, SQLiteProductionConfig, PostgresProductionConfig, get_config
+
+
+def pragma(app, name):
+    with app.app_context():
+        return db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+
+
+def test_sqlite_production_pragmas_are_applied(make_app):
+    app = make_app(SQLITE_PRAGMAS=SQLiteProductionConfig.SQLITE_PRAGMAS, SQLALCHEMY_ENGINE_OPTIONS=SQLiteProductionConfig.SQLALCHEMY_ENGINE_OPTIONS)
+    assert pragma(app, 'journal_mode') == 'wal'
+    assert pragma(app, 'synchronous') == 1  # NORMAL
+    assert pragma(app, 'busy_timeout') == 5000
+    assert pragma(app, 'cache_size') == -64000
+    assert pragma(app, 'temp_store') == 2  # MEMORY
+    with app.app_context():
+        assert db.engine.pool.size() == 10
+
+
+# PRAGMAs are per connection, so every pooled connection has to get them
+def test_pragmas_apply_to_every_connection(make_app):
+    app = make_app(SQLITE_PRAGMAS={'busy_timeout': 1234}, SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 3})
+    with app.app_context():
+        connections = [db.engine.connect() for _ in range(3)]
+        try:
+            assert [connection.exec_driver_sql('PRAGMA busy_timeout').scalar() for connection in connections] == [1234] * 3
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+def test_development_keeps_library_defaults(make_app):
+    app = make_app(SQLITE_PRAGMAS=DevelopmentConfig.SQLITE_PRAGMAS)
+    assert pragma(app, 'journal_mode') == 'delete'
+
+
+def test_profiles_are_picked_by_name(monkeypatch):
+    assert get_config('sqlite-prod') is SQLiteProductionConfig
+    assert get_config('postgres-prod') is PostgresProductionConfig
+    monkeypatch.setenv('APP_PROFILE', 'sqlite-prod')
+    assert get_config() is SQLiteProductionConfig
+    with pytest.raises(ValueError):
+        get_config('fast')
@@ -0,0 +1,80 @@
+from .conftest import sign_up, make_task
+
+
+def profile_header(app):
+    result = app.test_cli_runner().invoke(args=['profile-token'])
+    assert result.exit_code == 0
+    name, value = result.output.strip().split(': ', 1)
+    return {name: value}
+
+
+def admin_app(make_app, **config):
+    return make_app(SECRET_KEY='secret', ADMIN_USERNAMES={'admin'}, **config)
+
+
+def test_signed_header_profiles_a_request(make_app):
+    app = admin_app(make_app)
+    client = app.test_client()
+    admin = sign_up(client, 'admin')
+    response = client.get('/tasks', headers={**admin, **profile_header(app)})
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+
+    profiles = client.get('/profiles', headers=admin).json['profiles']
+    assert [(str(p['id']), p['path'], p['status']) for p in profiles] == [(profile_id, '/tasks', 200)]
+    download = client.get(f'/profiles/{profile_id}/prof', headers=admin)
+    assert download.status_code == 200 and download.data
+    assert client.get(f'/profiles/{profile_id}/collapsed', headers=admin).status_code == 200
+
+
+def test_forged_or_missing_header_is_not_profiled(make_app):
+    app = admin_app(make_app)
+    client = app.test_client()
+    admin = sign_up(client, 'admin')
+    assert 'X-Profile-Id' not in client.get('/tasks', headers=admin).headers
+    assert 'X-Profile-Id' not in client.get('/tasks', headers={**admin, 'X-Profile': 'profile'}).headers
+    # Signed with someone else's key
+    other = admin_app(make_app, database='other.db')
+    other.config['SECRET_KEY'] = 'not-the-secret'
+    assert 'X-Profile-Id' not in client.get('/tasks', headers={**admin, **profile_header(other)}).headers
+    assert client.get('/profiles', headers=admin).json['profiles'] == []
+
+
+def test_only_the_last_profiles_are_kept(make_app):
+    app = admin_app(make_app, PROFILE_KEEP=2)
+    client = app.test_client()
+    admin = sign_up(client, 'admin')
+    header = profile_header(app)
+    ids = [client.get('/tasks', headers={**admin, **header}).headers['X-Profile-Id'] for _ in range(3)]
+    profiles = client.get('/profiles', headers=admin).json['profiles']
+    assert [str(p['id']) for p in profiles] == ids[:0:-1]
+    assert client.get(f'/profiles/{ids[0]}/prof', headers=admin).status_code == 404
+
+
+def test_profiles_are_for_admins_only(make_app):
+    app = admin_app(make_app)
+    client = app.test_client()
+    sign_up(client, 'admin')
+    alice = sign_up(client, 'alice')
+    assert client.get('/profiles', headers=alice).status_code == 403
+    assert client.get('/slow-queries', headers=alice).status_code == 403
+    assert client.get('/profiles').status_code == 401
+
+
+def test_slow_queries_hide_user_parameters(make_app):
+    app = admin_app(make_app, SLOW_QUERY_MS=1e-9)
+    client = app.test_client()
+    admin = sign_up(client, 'admin')
+    token = admin['Authorization'].split()[1]
+    make_task(client, admin, title='Visible title')
+
+    queries = client.get('/slow-queries', headers=admin).json['queries']
+    user_queries = [q for q in queries if 'FROM user' in q['statement'] or 'UPDATE user' in q['statement']]
+    assert user_queries
+    logged = repr(queries)
+    assert token not in logged
+    assert "'admin'" not in repr([q['parameters'] for q in user_queries])
+    assert any('<str len=' in q['parameters'] for q in user_queries)
+    # Other tables keep their parameters for reproducing the query
+    assert 'Visible title' in logged
+    assert all(q['source'] is None or q['source'].startswith('app/') for q in queries)
@@ -0,0 +1,88 @@
+import threading
+import pytest
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+from app import db
+from app.models import User, Task, TaskChange
+from .conftest import sign_up, make_task
+
+
+def counts(app, user_id):
+    with app.app_context():
+        return (db.session.get(User, user_id) is not None,
+                db.session.scalar(db.select(db.func.count()).select_from(Task).where(Task.user_id == user_id)),
+                db.session.scalar(db.select(db.func.count()).select_from(TaskChange).where(TaskChange.user_id == user_id)))
+
+
+def test_delete_user_removes_tasks_and_changes(client, app):
+    alice = sign_up(client, 'alice')
+    bob = sign_up(client, 'bob')
+    for _ in range(3):
+        make_task(client, alice)
+    bobs = make_task(client, bob)
+    alice_id = client.get('/users/me', headers=alice).json['id']
+    assert client.delete(f'/users/{alice_id}', headers=alice).status_code == 200
+    assert counts(app, alice_id) == (False, 0, 0)
+    assert client.get(f'/tasks/{bobs}').status_code == 200
+
+
+# Over the threshold the user is locked out straight away and purged in batches by a background thread
+def test_big_user_is_purged_in_the_background(make_app):
+    app = make_app(USER_DELETE_BACKGROUND_THRESHOLD=2, PURGE_BATCH_SIZE=2)
+    client = app.test_client()
+    alice = sign_up(client, 'alice')
+    for _ in range(5):
+        make_task(client, alice)
+    alice_id = client.get('/users/me', headers=alice).json['id']
+    assert client.delete(f'/users/{alice_id}', headers=alice).status_code == 200
+    assert client.get('/users/me', headers=alice).status_code == 401
+    assert client.get('/token', auth=('alice', 'pw')).status_code == 401
+    for thread in threading.enumerate():
+        if thread.name == f'purge-user-{alice_id}':
+            thread.join(10)
+    assert counts(app, alice_id) == (False, 0, 0)
+
+
+def test_purge_tokens_clears_only_expired_tokens(client, app):
+    sign_up(client, 'alice')
+    sign_up(client, 'bob')
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.username == 'alice').values(token_expiration=datetime.now(timezone.utc) - timedelta(minutes=1)))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['purge-tokens', '--batch-size', '1'])
+    assert 'Cleared 1 expired tokens' in result.output
+    with app.app_context():
+        tokens = dict(db.session.execute(db.select(User.username, User.token)).all())
+    assert tokens['alice'] is None
+    assert tokens['bob'] is not None
+
+
+def test_purge_tokens_clears_every_batch(client, app):
+    for name in ['alice', 'bob', 'carol', 'dave']:
+        sign_up(client, name)
+    sign_up(client, 'erin')
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.username != 'erin').values(token_expiration=datetime.now(timezone.utc) - timedelta(minutes=1)))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['purge-tokens', '--batch-size', '3'])
+    assert 'Cleared 4 expired tokens' in result.output
+    with app.app_context():
+        assert db.session.scalars(db.select(User.username).where(User.token.is_not(None))).all() == ['erin']
+
+
+# Expired tokens are found through the index, not by scanning every user
+def test_expired_tokens_are_found_with_an_index(app):
+    with app.app_context():
+        select_stmt = db.select(User.id).where(User.token_expiration < datetime.now(timezone.utc)).order_by(User.token_expiration).limit(10)
+        sql = str(select_stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' / '.join(row[3] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+    assert 'ix_user_token_expiration' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+# A task can't be left behind by (or written after) a user's purge
+def test_task_needs_an_existing_user(app):
+    with app.app_context():
+        with pytest.raises(IntegrityError):
+            db.session.execute(db.insert(Task).values(title='Orphan', description='Description', dueDate=datetime(2030, 1, 1).date(), user_id=999))
+        db.session.rollback()
@@ -0,0 +1,78 @@
+from .conftest import sign_up, make_task
+
+
+def limited_app(make_app, **limits):
+    return make_app(RATE_LIMITS=limits, RATE_LIMIT_AUTH_FAILURES='5/minute')
+
+
+def from_ip(ip):
+    return {'REMOTE_ADDR': ip}
+
+
+def test_route_limit_answers_429_with_retry_after(make_app):
+    client = limited_app(make_app, create_task='3/minute').test_client()
+    headers = sign_up(client, 'alice')
+    for _ in range(3):
+        make_task(client, headers)
+    response = client.post('/tasks', headers=headers, json={'title': 'Task', 'description': 'Description', 'dueDate': '2030-01-01'})
+    assert response.status_code == 429
+    # One token comes back every 20 seconds
+    assert 0 < int(response.headers['Retry-After']) <= 20
+
+
+def test_route_limit_is_per_user(make_app):
+    client = limited_app(make_app, create_task='2/minute').test_client()
+    alice = sign_up(client, 'alice')
+    bob = sign_up(client, 'bob')
+    task_id = make_task(client, alice)
+    make_task(client, alice)
+    assert client.post('/tasks', headers=alice, json={}).status_code == 429
+    # Same IP, different user - a separate bucket
+    make_task(client, bob)
+    # ...and routes don't share buckets either
+    assert client.put(f'/tasks/{task_id}', headers=alice, json={'title': 'Edited'}).status_code == 200
+
+
+def test_anonymous_limit_is_per_ip(make_app):
+    client = limited_app(make_app, create_user='1/minute').test_client()
+    body = {'firstName': 'Test', 'lastName': 'User', 'password': 'pw'}
+    assert client.post('/users', json={**body, 'username': 'a', 'email': 'a@example.com'}, environ_base=from_ip('10.0.0.1')).status_code == 201
+    assert client.post('/users', json={**body, 'username': 'b', 'email': 'b@example.com'}, environ_base=from_ip('10.0.0.1')).status_code == 429
+    assert client.post('/users', json={**body, 'username': 'b', 'email': 'b@example.com'}, environ_base=from_ip('10.0.0.2')).status_code == 201
+
+
+# Making up a new username (or token) for every request mustn't get a fresh bucket
+def test_rotating_credentials_are_limited(make_app):
+    client = limited_app(make_app, get_token='10/minute').test_client()
+    statuses = [client.get('/token', auth=(f'nobody{i}', 'pw')).status_code for i in range(8)]
+    assert statuses == [401] * 5 + [429] * 3
+    statuses = [client.get('/users/me', headers={'Authorization': f'Bearer fake{i}'}).status_code for i in range(3)]
+    assert statuses == [429] * 3
+
+
+# Someone guessing alice's password only locks out their own IP
+def test_failed_logins_dont_lock_out_the_account(make_app):
+    client = limited_app(make_app, get_token='10/minute').test_client()
+    sign_up(client, 'alice')
+    for _ in range(5):
+        assert client.get('/token', auth=('alice', 'wrong'), environ_base=from_ip('10.0.0.66')).status_code == 401
+    assert client.get('/token', auth=('alice', 'pw'), environ_base=from_ip('10.0.0.66')).status_code == 429
+    assert client.get('/token', auth=('alice', 'pw'), environ_base=from_ip('10.0.0.1')).status_code == 200
+
+
+def test_per_ip_cap_covers_all_limited_routes(make_app):
+    app = make_app(RATE_LIMITS={}, RATE_LIMIT_PER_IP='3/minute')
+    client = app.test_client()
+    headers = sign_up(client, 'alice')
+    make_task(client, headers)
+    assert client.post('/tasks', headers=headers, json={}).status_code == 429
+    assert client.post('/tasks', headers=headers, json={}, environ_base=from_ip('10.0.0.2')).status_code == 400
+
+
+def test_proxy_fix_uses_forwarded_address(make_app):
+    client = make_app(RATE_LIMITS={'create_user': '1/minute'}, PROXY_FIX_X_FOR=1).test_client()
+    body = {'firstName': 'Test', 'lastName': 'User', 'password': 'pw'}
+    proxy = {'REMOTE_ADDR': '127.0.0.1'}
+    assert client.post('/users', json={**body, 'username': 'a', 'email': 'a@example.com'}, environ_base=proxy, headers={'X-Forwarded-For': '10.0.0.1'}).status_code == 201
+    assert client.post('/users', json={**body, 'username': 'b', 'email': 'b@example.com'}, environ_base=proxy, headers={'X-Forwarded-For': '10.0.0.2'}).status_code == 201
+    assert client.post('/users', json={**body, 'username': 'c', 'email': 'c@example.com'}, environ_base=proxy, headers={'X-Forwarded-For': '10.0.0.2'}).status_code == 429
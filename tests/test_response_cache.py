@@ -0,0 +1,130 @@
+import pytest
+from app.cache import TTLCache
+from .conftest import sign_up, make_task
+
+# One cache for every app in the test process - stands in for a cache server shared by all workers
+SHARED = TTLCache(maxsize=1000, ttl=60)
+
+
+def shared_cache(maxsize, ttl):
+    return SHARED
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_cache():
+    SHARED.clear()
+
+
+def test_cache_is_off_by_default(app):
+    assert app.extensions['response_cache'] is None
+
+
+def test_write_invalidates_cached_task_and_pages(make_app):
+    app = make_app(RESPONSE_CACHE_BACKEND='app.cache:TTLCache')
+    client = app.test_client()
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers, title='Old')
+    cache = app.extensions['response_cache']
+
+    assert client.get(f'/tasks/{task_id}').json['title'] == 'Old'
+    assert client.get('/tasks').json['tasks'][0]['title'] == 'Old'
+    assert client.get(f'/tasks/{task_id}').json['title'] == 'Old'
+    assert client.get('/tasks').json['tasks'][0]['title'] == 'Old'
+    assert cache.stats()['hits'] == 2
+
+    assert client.put(f'/tasks/{task_id}', headers=headers, json={'title': 'Edited'}).status_code == 200
+    assert client.get(f'/tasks/{task_id}').json['title'] == 'Edited'
+    assert client.get('/tasks').json['tasks'][0]['title'] == 'Edited'
+
+    # Core bulk writes go around the ORM events, so they have to invalidate too
+    response = client.patch('/tasks/bulk', headers=headers, json={'tasks': [{'id': task_id, 'title': 'Bulk edited'}]})
+    assert response.json['results'][0]['status'] == 200
+    assert client.get(f'/tasks/{task_id}').json['title'] == 'Bulk edited'
+    assert client.get('/tasks').json['tasks'][0]['title'] == 'Bulk edited'
+
+    client.delete('/tasks/bulk', headers=headers, json={'ids': [task_id]})
+    assert client.get(f'/tasks/{task_id}').status_code == 404
+    assert client.get('/tasks').json['tasks'] == []
+
+
+def test_author_change_invalidates_cached_task(make_app):
+    app = make_app(RESPONSE_CACHE_BACKEND='app.cache:TTLCache')
+    client = app.test_client()
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers)
+    assert client.get(f'/tasks/{task_id}').json['author']['username'] == 'alice'
+    user_id = client.get('/users/me', headers=headers).json['id']
+    client.delete(f'/users/{user_id}', headers=headers)
+    assert client.get(f'/tasks/{task_id}').status_code == 404
+
+
+def test_etag_changes_after_write(make_app):
+    app = make_app(RESPONSE_CACHE_BACKEND='app.cache:TTLCache')
+    client = app.test_client()
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers)
+    etag = client.get(f'/tasks/{task_id}').headers['ETag']
+    assert client.get(f'/tasks/{task_id}', headers={'If-None-Match': etag}).status_code == 304
+    client.put(f'/tasks/{task_id}', headers=headers, json={'completed': True})
+    response = client.get(f'/tasks/{task_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['completed'] is True
+
+
+# Two apps on one database, like two workers - with the cache off each read goes to the database
+def test_apps_sharing_a_database_see_each_others_writes(make_app):
+    client_a = make_app().test_client()
+    client_b = make_app().test_client()
+    headers = sign_up(client_a, 'alice')
+    task_id = make_task(client_a, headers, title='Old')
+    assert client_b.get(f'/tasks/{task_id}').json['title'] == 'Old'
+    assert client_b.get('/tasks').json['tasks'][0]['title'] == 'Old'
+    client_a.put(f'/tasks/{task_id}', headers=headers, json={'title': 'Edited'})
+    assert client_b.get(f'/tasks/{task_id}').json['title'] == 'Edited'
+    assert client_b.get('/tasks').json['tasks'][0]['title'] == 'Edited'
+
+
+# ...and with a shared backend a write through one app drops what the other one cached
+def test_apps_sharing_a_cache_backend_see_each_others_writes(make_app):
+    app_a = make_app(RESPONSE_CACHE_BACKEND='tests.test_response_cache:shared_cache')
+    app_b = make_app(RESPONSE_CACHE_BACKEND='tests.test_response_cache:shared_cache')
+    client_a, client_b = app_a.test_client(), app_b.test_client()
+    headers = sign_up(client_a, 'alice')
+    task_id = make_task(client_a, headers, title='Old')
+    for _ in range(2):
+        assert client_b.get(f'/tasks/{task_id}').json['title'] == 'Old'
+        assert client_b.get('/tasks').json['tasks'][0]['title'] == 'Old'
+    assert app_b.extensions['response_cache'].stats()['hits'] == 2
+
+    client_a.put(f'/tasks/{task_id}', headers=headers, json={'title': 'Edited'})
+    assert client_b.get(f'/tasks/{task_id}').json['title'] == 'Edited'
+    assert client_b.get('/tasks').json['tasks'][0]['title'] == 'Edited'
+
+    client_a.patch('/tasks/bulk', headers=headers, json={'tasks': [{'id': task_id, 'title': 'Bulk edited'}]})
+    assert client_b.get(f'/tasks/{task_id}').json['title'] == 'Bulk edited'
+    assert client_b.get('/tasks').json['tasks'][0]['title'] == 'Bulk edited'
+
+
+# A write that commits while a reader is storing its (now older) copy mustn't leave that copy in the cache
+@pytest.mark.parametrize('moment', ['before', 'after'])
+def test_invalidation_racing_set_task(make_app, moment):
+    app = make_app(RESPONSE_CACHE_BACKEND='app.cache:TTLCache')
+    cache = app.extensions['response_cache']
+    backend = cache.backend
+    original_set = backend.set
+
+    def set_then_invalidate(key, value, ttl=None):
+        if key == 'task:1' and moment == 'before':
+            cache.invalidate(task_ids=[1])
+        original_set(key, value, ttl)
+        if key == 'task:1' and moment == 'after':
+            cache.invalidate(task_ids=[1])
+
+    backend.set = set_then_invalidate
+    cache.set_task(1, 1, ({'title': 'Old'}, '"etag"', None), cache.generation())
+    assert cache.get_task(1) is None
+
+    # Without a write in between the entry is kept
+    backend.set = original_set
+    cache.set_task(1, 1, ({'title': 'Old'}, '"etag"', None), cache.generation())
+    assert cache.get_task(1) == ({'title': 'Old'}, '"etag"', None)
@@ -0,0 +1,67 @@
+import pytest
+from app.routing import STICKY_COOKIE
+from .conftest import sign_up, make_task
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    app = make_app(SQLALCHEMY_BINDS={'read': f'sqlite:///{tmp_path / "replica.db"}'})
+    sync_replica(app)
+    return app
+
+
+def sync_replica(app):
+    result = app.test_cli_runner().invoke(args=['sync-replica'])
+    assert 'Copied' in result.output, result.output
+
+
+# A GET from another client (another address, no cookies)
+def get_elsewhere(app, path, **kwargs):
+    return app.test_client().get(path, environ_base={'REMOTE_ADDR': '10.0.0.99'}, **kwargs)
+
+
+def titles(response):
+    return [task['title'] for task in response.json['tasks']]
+
+
+def test_gets_read_from_the_replica(app, client):
+    headers = sign_up(client, 'alice')
+    sync_replica(app)
+    make_task(client, headers, title='New')
+    # The replica hasn't caught up yet
+    assert titles(get_elsewhere(app, '/tasks')) == []
+    sync_replica(app)
+    assert titles(get_elsewhere(app, '/tasks')) == ['New']
+
+
+def test_writer_reads_its_own_writes(app, client):
+    headers = sign_up(client, 'alice')
+    sync_replica(app)
+    response = client.post('/tasks', headers=headers, json={'title': 'New', 'description': 'Description', 'dueDate': '2030-01-01'})
+    assert STICKY_COOKIE in response.headers.get('Set-Cookie', '')
+    # Pinned by the cookie...
+    assert titles(client.get('/tasks')) == ['New']
+    # ...and by the token, from a client that doesn't keep cookies
+    assert titles(get_elsewhere(app, '/tasks', headers=headers)) == ['New']
+
+
+def test_reads_dont_pin(app, client):
+    sign_up(client, 'alice')
+    sync_replica(app)
+    for path in ['/tasks', '/tasks/search?q=task', '/tasks/1']:
+        assert STICKY_COOKIE not in get_elsewhere(app, path).headers.get('Set-Cookie', '')
+
+
+def test_failed_writes_dont_pin(app, client):
+    headers = sign_up(client, 'alice')
+    response = client.post('/tasks', headers=headers, json={'title': 'New'})
+    assert response.status_code == 400
+    assert STICKY_COOKIE not in response.headers.get('Set-Cookie', '')
+
+
+# Pinning follows the writer's cookie and token, not their address
+def test_writer_doesnt_pin_their_address(app, client):
+    headers = sign_up(client, 'alice')
+    sync_replica(app)
+    make_task(client, headers, title='New')
+    assert titles(app.test_client().get('/tasks')) == []
@@ -0,0 +1,72 @@
+from .conftest import sign_up, make_task
+
+
+def titles(response):
+    assert response.status_code == 200, response.json
+    return [task['title'] for task in response.json['tasks']]
+
+
+def test_search_matches_prefixes_of_every_term(client):
+    headers = sign_up(client, 'alice')
+    make_task(client, headers, title='Buy groceries: milk')
+    make_task(client, headers, title='Buy groceries: eggs')
+    make_task(client, headers, title='Walk the dog')
+    assert sorted(titles(client.get('/tasks/search?q=gro'))) == ['Buy groceries: eggs', 'Buy groceries: milk']
+    assert titles(client.get('/tasks/search?q=gro mil')) == ['Buy groceries: milk']
+    assert titles(client.get('/tasks/search?q=cats')) == []
+    # The list endpoint's ?search filter uses the same index
+    assert titles(client.get('/tasks?search=dog')) == ['Walk the dog']
+
+
+def test_search_follows_edits_and_deletes(client):
+    headers = sign_up(client, 'alice')
+    task_id = make_task(client, headers, title='Buy milk')
+    client.put(f'/tasks/{task_id}', headers=headers, json={'title': 'Buy bread'})
+    assert titles(client.get('/tasks/search?q=milk')) == []
+    assert titles(client.get('/tasks/search?q=bread')) == ['Buy bread']
+    client.delete(f'/tasks/{task_id}', headers=headers)
+    assert titles(client.get('/tasks/search?q=bread')) == []
+
+
+def test_search_ranks_and_highlights(client):
+    headers = sign_up(client, 'alice')
+    make_task(client, headers, title='Report', description='Description')
+    make_task(client, headers, title='Report report report', description='Description')
+    response = client.get('/tasks/search?q=report')
+    tasks = response.json['tasks']
+    assert [task['title'] for task in tasks] == ['Report report report', 'Report']
+    assert tasks[0]['rank'] >= tasks[1]['rank']
+    assert '<mark>Report</mark>' in tasks[0]['snippet']
+
+
+def test_search_pages(client):
+    headers = sign_up(client, 'alice')
+    for i in range(5):
+        make_task(client, headers, title=f'Chore {i}')
+    seen = []
+    url = '/tasks/search?q=chore&limit=2'
+    while url:
+        response = client.get(url)
+        seen += titles(response)
+        url = f"/tasks/search?q=chore&limit=2&next={response.json['next']}" if response.json['next'] else None
+    assert sorted(seen) == [f'Chore {i}' for i in range(5)]
+
+
+# Only word characters reach the FTS query, so its syntax can't be injected
+def test_search_ignores_query_syntax(client):
+    headers = sign_up(client, 'alice')
+    make_task(client, headers, title='Fix the "quoted" thing')
+    for q in ['"', 'quoted OR', 'NEAR(quo', 'title:*', '*', 'quo"ted']:
+        assert client.get('/tasks/search', query_string={'q': q}).status_code == 200
+    assert titles(client.get('/tasks/search', query_string={'q': '"quoted" thing!'})) == ['Fix the "quoted" thing']
+    assert client.get('/tasks/search').status_code == 400
+
+
+# Task text is user input - only the <mark> tags in a snippet are HTML
+def test_snippets_are_escaped(client):
+    headers = sign_up(client, 'alice')
+    make_task(client, headers, title='<script>alert("report")</script> Tom & Jerry')
+    snippet = client.get('/tasks/search?q=report').json['tasks'][0]['snippet']
+    assert '<script>' not in snippet
+    assert '&lt;script&gt;alert(&quot;<mark>report</mark>&quot;)&lt;/script&gt;' in snippet
+    assert 'Tom &amp; Jerry' in snippet
@@ -0,0 +1,118 @@
+from app import db, purge
+from app.models import User, Task, UserTaskStats
+from .conftest import sign_up, make_task
+
+
+# {user_id: (total, completed)} as stored in user_task_stats and as counted from task - they should always agree
+def stored_stats(app):
+    with app.app_context():
+        rows = db.session.execute(db.select(UserTaskStats.user_id, UserTaskStats.total, UserTaskStats.completed)).all()
+        return {user_id: (total, completed) for user_id, total, completed in rows if total or completed}
+
+
+def counted_stats(app):
+    with app.app_context():
+        rows = db.session.execute(db.select(Task.user_id, db.func.count(), db.func.sum(db.case((Task.completed, 1), else_=0))).group_by(Task.user_id)).all()
+        return {user_id: (total, completed) for user_id, total, completed in rows}
+
+
+def my_stats(client, headers):
+    stats = client.get('/users/me/stats', headers=headers).json
+    return stats['total'], stats['completed']
+
+
+def test_counters_follow_single_task_writes(client, app):
+    headers = sign_up(client, 'alice')
+    first = make_task(client, headers)
+    second = make_task(client, headers)
+    assert my_stats(client, headers) == (2, 0)
+    client.put(f'/tasks/{first}', headers=headers, json={'completed': True})
+    assert my_stats(client, headers) == (2, 1)
+    # Saving the same value again isn't a change
+    client.put(f'/tasks/{first}', headers=headers, json={'completed': True})
+    assert my_stats(client, headers) == (2, 1)
+    client.delete(f'/tasks/{first}', headers=headers)
+    client.delete(f'/tasks/{second}', headers=headers)
+    assert my_stats(client, headers) == (0, 0)
+    assert stored_stats(app) == counted_stats(app)
+
+
+def test_counters_follow_bulk_writes(client, app):
+    headers = sign_up(client, 'alice')
+    tasks = [{'title': f'Task {i}', 'description': 'Description', 'dueDate': '2030-01-01'} for i in range(4)]
+    ids = [result['id'] for result in client.post('/tasks/bulk', headers=headers, json={'tasks': tasks}).json['results']]
+    assert my_stats(client, headers) == (4, 0)
+    # A task listed twice counts from whatever the previous item left it at
+    client.patch('/tasks/bulk', headers=headers, json={'tasks': [
+        {'id': ids[0], 'completed': True}, {'id': ids[1], 'completed': True}, {'id': ids[1], 'completed': False},
+        {'id': ids[2], 'completed': True}, {'id': ids[2], 'completed': True},
+    ]})
+    assert my_stats(client, headers) == (4, 2)
+    client.delete('/tasks/bulk', headers=headers, json={'ids': [ids[0], ids[1], ids[0]]})
+    assert my_stats(client, headers) == (2, 1)
+    assert stored_stats(app) == counted_stats(app)
+
+
+def test_counters_follow_user_deletes(client, app):
+    alice = sign_up(client, 'alice')
+    bob = sign_up(client, 'bob')
+    make_task(client, alice)
+    make_task(client, bob)
+    alice_id = client.get('/users/me', headers=alice).json['id']
+    client.delete(f'/users/{alice_id}', headers=alice)
+    assert alice_id not in stored_stats(app)
+    assert stored_stats(app) == counted_stats(app)
+
+
+# Users over the threshold are locked out and purged in batches - here by `flask purge-users` instead of the
+# background thread, so the test can check the result
+def test_counters_follow_background_user_purge(make_app, monkeypatch):
+    monkeypatch.setattr(purge, 'purge_user_in_background', lambda app, user_id: None)
+    app = make_app(USER_DELETE_BACKGROUND_THRESHOLD=2)
+    client = app.test_client()
+    alice = sign_up(client, 'alice')
+    bob = sign_up(client, 'bob')
+    for i in range(5):
+        task_id = make_task(client, alice)
+        if i % 2:
+            client.put(f'/tasks/{task_id}', headers=alice, json={'completed': True})
+    make_task(client, bob)
+    alice_id = client.get('/users/me', headers=alice).json['id']
+
+    assert client.delete(f'/users/{alice_id}', headers=alice).status_code == 200
+    assert client.get('/users/me', headers=alice).status_code == 401
+    assert stored_stats(app)[alice_id] == (5, 2)
+
+    result = app.test_cli_runner().invoke(args=['purge-users', '--batch-size', '2'])
+    assert 'Purged 1 users' in result.output
+    with app.app_context():
+        assert db.session.get(User, alice_id) is None
+    assert alice_id not in stored_stats(app)
+    assert stored_stats(app) == counted_stats(app)
+
+
+def test_reconcile_fixes_drifted_counters(client, app):
+    headers = sign_up(client, 'alice')
+    make_task(client, headers)
+    make_task(client, headers)
+    with app.app_context():
+        db.session.execute(db.update(UserTaskStats).values(total=99))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['reconcile-stats'])
+    assert '(1 had drifted)' in result.output
+    assert stored_stats(app) == counted_stats(app)
+    assert my_stats(client, headers) == (2, 0)
+
+
+def test_admin_stats(make_app):
+    app = make_app(ADMIN_USERNAMES={'boss'})
+    client = app.test_client()
+    boss = sign_up(client, 'boss')
+    alice = sign_up(client, 'alice')
+    make_task(client, alice, due_date='2000-01-01')
+    done = make_task(client, alice)
+    client.put(f'/tasks/{done}', headers=alice, json={'completed': True})
+    make_task(client, boss)
+    assert client.get('/stats', headers=alice).status_code == 403
+    assert client.get('/stats', headers=boss).json == {'usersWithTasks': 2, 'total': 3, 'completed': 1, 'open': 2, 'overdue': 1}
+    assert client.get('/users/me/stats', headers=alice).json == {'total': 2, 'completed': 1, 'open': 1, 'overdue': 1}
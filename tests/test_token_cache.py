@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from app import db
+from app.models import User
+from .conftest import sign_up
+
+
+def test_token_is_cached(client, app):
+    headers = sign_up(client, 'alice')
+    client.get('/users/me', headers=headers)
+    token = headers['Authorization'].split()[1]
+    with app.app_context():
+        assert app.extensions['token_cache'].get(token) is not None
+
+
+def test_deleted_users_token_is_rejected(client):
+    headers = sign_up(client, 'alice')
+    user_id = client.get('/users/me', headers=headers).json['id']
+    assert client.delete(f'/users/{user_id}', headers=headers).status_code == 200
+    assert client.get('/users/me', headers=headers).status_code == 401
+
+
+# The token cache is per app - another app stops accepting the token once its cached copy expires
+def test_deleted_users_token_is_rejected_by_other_apps(make_app):
+    client_a = make_app().test_client()
+    client_b = make_app(TOKEN_CACHE_TTL=0).test_client()
+    headers = sign_up(client_a, 'alice')
+    assert client_b.get('/users/me', headers=headers).status_code == 200
+    user_id = client_a.get('/users/me', headers=headers).json['id']
+    client_a.delete(f'/users/{user_id}', headers=headers)
+    assert client_b.get('/users/me', headers=headers).status_code == 401
+
+
+def test_rotated_token_is_rejected(client, app):
+    old_headers = sign_up(client, 'alice')
+    assert client.get('/users/me', headers=old_headers).status_code == 200
+    # A token is handed out again until it's about to expire
+    with app.app_context():
+        db.session.execute(db.update(User).values(token_expiration=datetime.now(timezone.utc) + timedelta(seconds=30)))
+        db.session.commit()
+    new_token = client.get('/token', auth=('alice', 'pw')).json['token']
+    assert client.get('/users/me', headers=old_headers).status_code == 401
+    assert client.get('/users/me', headers={'Authorization': f'Bearer {new_token}'}).status_code == 200
+
+
+# Only the token lookup is cached - a change made elsewhere shows up (with a new ETag) straight away
+def test_cached_token_loads_the_current_user(client, app):
+    headers = sign_up(client, 'alice')
+    first = client.get('/users/me', headers=headers)
+    with app.app_context():
+        user = db.session.scalar(db.select(User).where(User.username == 'alice'))
+        user.first_name = 'Alicia'
+        db.session.commit()
+    second = client.get('/users/me', headers=headers)
+    assert second.json['firstName'] == 'Alicia'
+    assert second.headers['ETag'] != first.headers['ETag']
@@ -0,0 +1,4 @@
+from app import create_app
+
+# Entry point for WSGI servers, e.g. `gunicorn wsgi:app` (see gunicorn.conf.py)
+app = create_app()